@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Agendador de Consultas com Várias Chaves de API
+#
+# ### Distribui consultas de vários tribunais entre um conjunto de chaves de API, para que o limite de uma chave ou um tribunal lento não travem a coleta inteira.
+#
+# ## Funcionamento:
+#     - Uma fila por tribunal, atendida em rodízio (round-robin), para que nenhum tribunal monopolize os workers.
+#     - Cada tribunal tem um limite de requisições simultâneas ajustado dinamicamente: cresce enquanto as respostas chegam bem e cai pela metade a cada 429/erro (AIMD). Tribunais rápidos recebem mais workers; os lentos não seguram a fila.
+#     - Cada chave acompanha latência média por tribunal, taxa de throttling (429) e fica em espera após um 429 (respeitando o Retry-After). Cada requisição usa a chave saudável mais rápida para aquele tribunal.
+#     - Consultas que falham por throttling ou indisponibilidade voltam para o início da fila do tribunal e são repetidas com outra chave; throttling não consome tentativas, mas uma consulta desiste depois de muitos 429 (cota das chaves esgotada).
+#     - Chaves que recebem 401/403 (inválidas ou revogadas) são desativadas e a consulta é repetida com outra chave.
+#
+# Uso:
+#     DATAJUD_API_KEYS="APIKey aaa,APIKey bbb" python agendador.py --orgao tjpe:1234 --orgao trf5:567 --banco cnj.sqlite
+#     python agendador.py --chaves chaves.txt --orgao tjpe:1234 --orgao tjsp:89 --banco cnj.sqlite
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+
+from base_analitica import carregar_hits, conectar, consulta_orgao
+from datajud import API_KEY, pesquisar
+
+
+# suavização das médias móveis de latência e de throttling
+PESO_EWMA = 0.2
+
+# status que indicam limite ou indisponibilidade momentânea (a consulta é repetida)
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+# status de chave inválida ou revogada: a chave sai do conjunto e a consulta é repetida com outra
+STATUS_CHAVE_INVALIDA = {401, 403}
+
+
+class Tarefa:
+    # uma consulta a um tribunal; ao_concluir(tarefa, resposta) pode devolver novas tarefas (ex.: a próxima página)
+    def __init__(self, tribunal, consulta, ao_concluir=None, contexto=None):
+        self.tribunal = tribunal
+        self.consulta = consulta
+        self.ao_concluir = ao_concluir
+        self.contexto = contexto
+        self.tentativas = 0
+        self.throttles = 0
+
+
+class EstadoChave:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.em_uso = 0
+        self.sucessos = 0
+        self.throttles = 0
+        self.erros = 0
+        self.taxa_throttle = 0.0
+        self.bloqueada_ate = 0.0
+        self.falhas_seguidas = 0
+        self.latencia = {}
+        self.desativada = False
+
+    def saudavel(self, agora):
+        return not self.desativada and agora >= self.bloqueada_ate
+
+
+class EstadoTribunal:
+    def __init__(self, limite_inicial):
+        self.fila = deque()
+        self.em_andamento = 0
+        self.limite = float(limite_inicial)
+        self.latencia = None
+        self.sucessos = 0
+        self.throttles = 0
+        self.erros = 0
+        self.bloqueado_ate = 0.0
+
+
+def ewma(atual, novo):
+    return novo if atual is None else (1 - PESO_EWMA) * atual + PESO_EWMA * novo
+
+
+class Agendador:
+    def __init__(self, api_keys=None, workers=8, limite_inicial=2, limite_maximo=16, por_chave=4, tentativas=5,
+                 espera_throttle=5.0, espera_maxima=120.0, limite_throttles=30):
+        api_keys = api_keys or [API_KEY]
+        self.chaves = [EstadoChave(api_key) for api_key in dict.fromkeys(api_keys)]
+        self.tribunais = {}
+        self.workers = workers
+        self.limite_inicial = limite_inicial
+        self.limite_maximo = limite_maximo
+        self.por_chave = por_chave
+        self.tentativas = tentativas
+        self.espera_throttle = espera_throttle
+        self.espera_maxima = espera_maxima
+        self.limite_throttles = limite_throttles
+
+        self.condicao = threading.Condition()
+        self.lock_callbacks = threading.Lock()
+        self.ordem = []
+        self.cursor = 0
+        self.em_andamento = 0
+        self.falhas = []
+        self.local = threading.local()
+
+    # ## Filas
+
+    def adicionar(self, tarefa, inicio=False):
+        with self.condicao:
+            if tarefa.tribunal not in self.tribunais:
+                self.tribunais[tarefa.tribunal] = EstadoTribunal(self.limite_inicial)
+                self.ordem.append(tarefa.tribunal)
+            fila = self.tribunais[tarefa.tribunal].fila
+            if inicio:
+                fila.appendleft(tarefa)
+            else:
+                fila.append(tarefa)
+            self.condicao.notify()
+
+    def pendente(self):
+        return self.em_andamento > 0 or any(estado.fila for estado in self.tribunais.values())
+
+    # ## Escolha da próxima requisição
+
+    def escolher_chave(self, tribunal, agora):
+        # a chave saudável com menor latência esperada para o tribunal, penalizada pelo uso e pelo throttling
+        candidatas = [chave for chave in self.chaves if chave.saudavel(agora) and chave.em_uso < self.por_chave]
+        if not candidatas:
+            return None
+
+        latencia_tribunal = self.tribunais[tribunal].latencia or 1.0
+
+        def custo(chave):
+            return chave.latencia.get(tribunal, latencia_tribunal) * (1 + chave.em_uso) * (1 + 4 * chave.taxa_throttle)
+
+        return min(candidatas, key=custo)
+
+    def proxima(self):
+        # rodízio entre os tribunais com fila e capacidade livre; devolve (tarefa, chave) ou None se nada pode sair agora
+        agora = time.monotonic()
+        for deslocamento in range(len(self.ordem)):
+            tribunal = self.ordem[(self.cursor + deslocamento) % len(self.ordem)]
+            estado = self.tribunais[tribunal]
+            if not estado.fila or estado.em_andamento >= int(estado.limite) or agora < estado.bloqueado_ate:
+                continue
+            chave = self.escolher_chave(tribunal, agora)
+            if chave is None:
+                return None
+            self.cursor = (self.cursor + deslocamento + 1) % len(self.ordem)
+            estado.em_andamento += 1
+            chave.em_uso += 1
+            self.em_andamento += 1
+            return estado.fila.popleft(), chave
+        return None
+
+    def tempo_ate_liberar(self):
+        # quanto esperar até a próxima chave ou tribunal sair do bloqueio
+        agora = time.monotonic()
+        bloqueios = [chave.bloqueada_ate for chave in self.chaves if not chave.desativada]
+        bloqueios += [estado.bloqueado_ate for estado in self.tribunais.values()]
+        futuros = [bloqueio - agora for bloqueio in bloqueios if bloqueio > agora]
+        return min(futuros) if futuros else 1.0
+
+    # ## Execução
+
+    def sessao(self):
+        if not hasattr(self.local, 'sessao'):
+            self.local.sessao = requests.Session()
+        return self.local.sessao
+
+    def worker(self):
+        while True:
+            with self.condicao:
+                while True:
+                    if not any(not chave.desativada for chave in self.chaves):
+                        self.descartar_filas('nenhuma chave de API válida')
+                    if not self.pendente():
+                        self.condicao.notify_all()
+                        return
+                    escolha = self.proxima()
+                    if escolha:
+                        break
+                    self.condicao.wait(timeout=self.tempo_ate_liberar())
+            tarefa, chave = escolha
+
+            inicio = time.monotonic()
+            try:
+                resposta = pesquisar(tarefa.tribunal, tarefa.consulta, sessao=self.sessao(), api_key=chave.api_key)
+            except requests.HTTPError as erro:
+                self.registrar_falha(tarefa, chave, erro.response.status_code, erro.response.headers.get('Retry-After'), erro)
+            except requests.RequestException as erro:
+                self.registrar_falha(tarefa, chave, None, None, erro)
+            except Exception as erro:
+                # ex.: FileNotFoundError no modo de reprodução; não adianta repetir
+                self.registrar_erro(tarefa, erro)
+            else:
+                self.registrar_sucesso(tarefa, chave, time.monotonic() - inicio)
+                try:
+                    self.concluir(tarefa, resposta)
+                except Exception as erro:
+                    # ex.: erro do SQLite no callback; a tarefa fica registrada e o worker continua
+                    self.registrar_erro(tarefa, erro)
+            finally:
+                with self.condicao:
+                    self.tribunais[tarefa.tribunal].em_andamento -= 1
+                    chave.em_uso -= 1
+                    self.em_andamento -= 1
+                    self.condicao.notify_all()
+
+    def concluir(self, tarefa, resposta):
+        if tarefa.ao_concluir is None:
+            return
+        # callbacks serializados: podem gravar em arquivos ou bancos sem se preocupar com concorrência
+        with self.lock_callbacks:
+            novas = tarefa.ao_concluir(tarefa, resposta) or []
+        for nova in novas:
+            self.adicionar(nova)
+
+    def registrar_sucesso(self, tarefa, chave, duracao):
+        with self.condicao:
+            estado = self.tribunais[tarefa.tribunal]
+            estado.sucessos += 1
+            estado.latencia = ewma(estado.latencia, duracao)
+            # aumento aditivo: cerca de +1 requisição simultânea a cada "limite" respostas bem-sucedidas
+            estado.limite = min(estado.limite + 1 / estado.limite, self.limite_maximo)
+            chave.sucessos += 1
+            chave.falhas_seguidas = 0
+            chave.taxa_throttle = ewma(chave.taxa_throttle, 0.0)
+            chave.latencia[tarefa.tribunal] = ewma(chave.latencia.get(tarefa.tribunal), duracao)
+
+    def registrar_falha(self, tarefa, chave, status, retry_after, erro):
+        if status in STATUS_CHAVE_INVALIDA:
+            with self.condicao:
+                if not chave.desativada:
+                    print(f'Chave desativada após HTTP {status}')
+                chave.desativada = True
+                chave.erros += 1
+            # a consulta não tem culpa: volta para a fila sem gastar tentativa
+            self.adicionar(tarefa, inicio=True)
+            return
+
+        repetir = status is None or status in STATUS_REPETIR
+        with self.condicao:
+            estado = self.tribunais[tarefa.tribunal]
+            agora = time.monotonic()
+            # redução multiplicativa do paralelismo do tribunal
+            estado.limite = max(estado.limite / 2, 1.0)
+
+            if status == 429:
+                estado.throttles += 1
+                chave.throttles += 1
+                chave.falhas_seguidas += 1
+                chave.taxa_throttle = ewma(chave.taxa_throttle, 1.0)
+                try:
+                    espera = float(retry_after)
+                except (TypeError, ValueError):
+                    espera = self.espera_throttle * 2 ** (chave.falhas_seguidas - 1)
+                chave.bloqueada_ate = agora + min(espera, self.espera_maxima)
+            else:
+                estado.erros += 1
+                chave.erros += 1
+                # erro do endpoint: o tribunal espera um pouco, as chaves seguem livres para os outros
+                estado.bloqueado_ate = agora + min(self.espera_throttle * 2 ** min(tarefa.tentativas, 5), self.espera_maxima)
+
+        # throttling é da chave, não da consulta: não consome tentativas (a chave já fica em espera), mas tem limite
+        # próprio, para que a cota esgotada de todas as chaves não devolva a consulta à fila para sempre
+        if status == 429:
+            tarefa.throttles += 1
+            repetir = tarefa.throttles < self.limite_throttles
+        else:
+            tarefa.tentativas += 1
+            repetir = repetir and tarefa.tentativas < self.tentativas
+        if repetir:
+            self.adicionar(tarefa, inicio=True)
+        else:
+            self.registrar_erro(tarefa, erro)
+
+    def registrar_erro(self, tarefa, erro):
+        # falha definitiva da tarefa, devolvida por executar()
+        print(f'Erro na requisição ({tarefa.tribunal}): {erro!r}')
+        with self.condicao:
+            self.falhas.append((tarefa, erro))
+
+    def descartar_filas(self, motivo):
+        # chamado com self.condicao adquirida: tudo que ainda está na fila vira falha
+        for estado in self.tribunais.values():
+            while estado.fila:
+                self.falhas.append((estado.fila.popleft(), RuntimeError(motivo)))
+
+    def executar(self):
+        # processa as filas até esvaziar, inclusive as tarefas criadas pelos callbacks
+        threads = [threading.Thread(target=self.worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.falhas
+
+    # ## Relatório
+
+    def relatorio(self):
+        linhas = []
+        for tribunal, estado in self.tribunais.items():
+            latencia = f'{estado.latencia:.2f}s' if estado.latencia else '-'
+            linhas.append(f'{tribunal}: {estado.sucessos} ok, {estado.throttles} 429, {estado.erros} erros, '
+                          f'latência {latencia}, paralelismo {int(estado.limite)}')
+        for i, chave in enumerate(self.chaves, 1):
+            linhas.append(f'chave {i}: {chave.sucessos} ok, {chave.throttles} 429, {chave.erros} erros, '
+                          f'throttling {chave.taxa_throttle:.0%}' + (' (desativada)' if chave.desativada else ''))
+        return '\n'.join(linhas)
+
+
+# # Coleta paginada de órgãos julgadores
+
+def tarefas_orgaos(orgaos, ao_receber, tamanho=None, campos=None):
+    # cria a primeira página de cada (tribunal, código); as próximas páginas entram na fila à medida que chegam
+    def ao_concluir(tarefa, resposta):
+        hits = resposta['hits']['hits']
+        if not hits:
+            return []
+        ao_receber(tarefa.tribunal, tarefa.contexto, hits)
+        consulta = dict(tarefa.consulta, search_after=hits[-1]['sort'])
+        return [Tarefa(tarefa.tribunal, consulta, ao_concluir, tarefa.contexto)]
+
+    opcoes = {'campos': campos}
+    if tamanho:
+        opcoes['tamanho'] = tamanho
+    return [Tarefa(tribunal, consulta_orgao(codigo, **opcoes), ao_concluir, codigo) for tribunal, codigo in orgaos]
+
+
+def ler_chaves(caminho=None):
+    # chaves de um arquivo (uma por linha) ou da variável DATAJUD_API_KEYS (separadas por vírgula)
+    if caminho:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return [linha.strip() for linha in arquivo if linha.strip()]
+    chaves = os.environ.get('DATAJUD_API_KEYS')
+    if chaves:
+        return [chave.strip() for chave in chaves.split(',') if chave.strip()]
+    return [API_KEY]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Coleta órgãos julgadores de vários tribunais distribuindo a carga entre chaves de API.')
+    parser.add_argument('--orgao', required=True, action='append', help='tribunal:codigo do órgão julgador (pode repetir)')
+    parser.add_argument('--chaves', help='arquivo com uma chave de API por linha')
+    parser.add_argument('--banco', default='cnj.sqlite', help='base analítica onde os processos são gravados')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--por-chave', type=int, default=4, help='requisições simultâneas por chave')
+    parser.add_argument('--limite-throttles', type=int, default=30, help='respostas 429 aceitas por consulta antes de desistir')
+    args = parser.parse_args()
+
+    orgaos = []
+    for item in args.orgao:
+        tribunal, codigo = item.split(':')
+        orgaos.append((tribunal, int(codigo)))
+
+    # os callbacks rodam serializados nos workers, então a conexão pode ser compartilhada entre threads
+    con = conectar(args.banco, check_same_thread=False)
+    totais = {}
+
+    def ao_receber(tribunal, codigo, hits):
+        totais[(tribunal, codigo)] = totais.get((tribunal, codigo), 0) + carregar_hits(con, tribunal, hits)
+
+    agendador = Agendador(ler_chaves(args.chaves), workers=args.workers, por_chave=args.por_chave,
+                          limite_throttles=args.limite_throttles)
+    for tarefa in tarefas_orgaos(orgaos, ao_receber):
+        agendador.adicionar(tarefa)
+
+    inicio = time.monotonic()
+    falhas = agendador.executar()
+
+    for (tribunal, codigo), total in sorted(totais.items()):
+        print(f'{tribunal} - órgão {codigo}: {total} processos carregados')
+    print(f'Tempo total: {time.monotonic() - inicio:.1f}s, {len(falhas)} consultas com falha')
+    # uma página perdida interrompe o search_after daquele órgão: o carregamento dele ficou incompleto
+    for tribunal, codigo in sorted({(tarefa.tribunal, tarefa.contexto) for tarefa, _ in falhas}):
+        print(f'INCOMPLETO: {tribunal} - órgão {codigo}')
+    print(agendador.relatorio())
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Base Analítica de Processos (SQLite)
+#
+# ### Carrega processos e movimentações de vários órgãos e tribunais em um único banco SQLite, para consultar as estatísticas do notebook com SQL em vez de abrir várias planilhas.
+#
+# ## Funcionalidades:
+#     - Tabelas `processos`, `processo_assuntos` e `movimentos`, com índices por tribunal, código do órgão, classe, assunto e datas.
+#     - Views com as estatísticas do notebook: `v_processos` (com `contagem_dias`), `v_julgados`, `v_media_tempo_por_assunto`, `v_media_tempo_por_classe` e `v_comparativo_ano`.
+#     - Funções que consultam as views com filtros parametrizados (tribunal, órgão, ano), ex.: tempo médio por assunto em todas as varas do TJPE em 2023.
+#
+# Uso:
+#     python base_analitica.py carregar --banco cnj.sqlite --tribunal tjpe --orgao 1234
+#     python base_analitica.py sql --banco cnj.sqlite "select * from v_comparativo_ano where tribunal = 'tjpe'"
+
+import argparse
+import json
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from datajud import pesquisar
+
+
+# situações que indicam processo julgado (mesma lista da Etapa de Análise do notebook)
+terminado = ['definitivo', 'baixa definitiva', 'baixa', 'improcedência', 'procedência', 'procedência em parte', 'incompetência',
+             'extinção da execução ou do cumprimento da sentença', 'prescrição intercorrente', 'ausência de pressupostos processuais',
+             'ausência das condições da ação', 'desistência', 'abandono da causa']
+
+# documentos por página na carga paginada
+TAMANHO_PAGINA = 1000
+
+# processos sem algum destes campos ficam fora das estatísticas, como faz o dropna do notebook
+CAMPOS_OBRIGATORIOS = ('classe', 'assunto', 'formato', 'data_ajuizamento', 'situacao', 'ultimo_mov')
+
+
+ESQUEMA = """
+create table if not exists processos (
+    tribunal text not null,
+    numero_processo text not null,
+    grau text not null default '',
+    classe_codigo integer,
+    classe text,
+    assunto text,
+    formato text,
+    orgao_codigo integer,
+    orgao_julgador text,
+    municipio integer,
+    data_ajuizamento text,
+    ultima_atualizacao text,
+    situacao text,
+    ultimo_mov text,
+    ano_ajuizamento integer,
+    julgado integer not null default 0,
+    definitivo integer not null default 0,
+    dias_ate_ultimo_mov integer,
+    valido integer not null default 0,
+    primary key (tribunal, numero_processo, grau)
+);
+
+create table if not exists processo_assuntos (
+    tribunal text not null,
+    numero_processo text not null,
+    grau text not null default '',
+    assunto_codigo integer,
+    assunto text
+);
+
+create table if not exists movimentos (
+    tribunal text not null,
+    numero_processo text not null,
+    grau text not null default '',
+    data text,
+    codigo integer,
+    descricao_movimento text,
+    complementos text
+);
+
+create index if not exists ix_processos_orgao on processos (tribunal, orgao_codigo);
+create index if not exists ix_processos_ajuizamento on processos (tribunal, ano_ajuizamento, data_ajuizamento);
+create index if not exists ix_processos_ultimo_mov on processos (ultimo_mov);
+create index if not exists ix_processo_assuntos_processo on processo_assuntos (tribunal, numero_processo, grau);
+create index if not exists ix_processo_assuntos_assunto on processo_assuntos (assunto, tribunal);
+create index if not exists ix_movimentos_processo on movimentos (tribunal, numero_processo, grau, data);
+
+-- índices de cobertura: cada consulta das estatísticas é respondida só com o índice, já na ordem do group by
+create index if not exists ix_processos_assunto_tempo on processos
+    (tribunal, valido, julgado, assunto, ano_ajuizamento, orgao_codigo, definitivo, dias_ate_ultimo_mov, data_ajuizamento);
+create index if not exists ix_processos_classe_tempo on processos
+    (tribunal, valido, julgado, classe, ano_ajuizamento, orgao_codigo, definitivo, dias_ate_ultimo_mov, data_ajuizamento);
+create index if not exists ix_processos_ano on processos
+    (tribunal, valido, ano_ajuizamento, orgao_codigo, julgado, formato);
+
+-- contagem_dias como no notebook: baixa/arquivamento definitivo conta até o último movimento, os demais até hoje.
+-- só entram os processos válidos (processo_valido), como faz o dropna do notebook
+create view if not exists v_processos as
+select p.*,
+       case when definitivo = 1 then dias_ate_ultimo_mov
+            else cast(julianday('now') - julianday(data_ajuizamento) as integer)
+       end as contagem_dias
+from processos p
+where valido = 1;
+
+create view if not exists v_julgados as
+select tribunal, orgao_codigo, orgao_julgador,
+       count(*) as total_processos,
+       sum(julgado) as quantidade_julgados,
+       count(*) - sum(julgado) as quantidade_nao_julgados,
+       100.0 * sum(julgado) / count(*) as porcentagem_julgados,
+       100.0 * (count(*) - sum(julgado)) / count(*) as porcentagem_nao_julgados,
+       100.0 * sum(formato = 'físico') / count(*) as porcentagem_processos_fisicos
+from v_processos
+group by tribunal, orgao_codigo, orgao_julgador;
+
+-- médias sobre os processos julgados, como nos gráficos do notebook; soma_dias permite recombinar grupos
+create view if not exists v_media_tempo_por_assunto as
+select tribunal, orgao_codigo, ano_ajuizamento, assunto,
+       count(*) as quantidade, sum(contagem_dias) as soma_dias, cast(avg(contagem_dias) as integer) as media_dias
+from v_processos
+where julgado = 1
+group by tribunal, orgao_codigo, ano_ajuizamento, assunto;
+
+create view if not exists v_media_tempo_por_classe as
+select tribunal, orgao_codigo, ano_ajuizamento, classe,
+       count(*) as quantidade, sum(contagem_dias) as soma_dias, cast(avg(contagem_dias) as integer) as media_dias
+from v_processos
+where julgado = 1
+group by tribunal, orgao_codigo, ano_ajuizamento, classe;
+
+create view if not exists v_comparativo_ano as
+select tribunal, orgao_codigo, ano_ajuizamento as ano,
+       count(*) as quantidade_ajuizados, sum(julgado) as quantidade_julgados
+from v_processos
+group by tribunal, orgao_codigo, ano_ajuizamento;
+"""
+
+
+def conectar(caminho, check_same_thread=True):
+    con = sqlite3.connect(caminho, check_same_thread=check_same_thread)
+    con.execute('pragma journal_mode = wal')
+    con.execute('pragma synchronous = normal')
+    con.executescript(ESQUEMA)
+    return con
+
+
+# # Carga
+
+def normalizar_data(valor):
+    # a API devolve datas como '2020-03-12T00:00:00.000Z' ou '20200312000000'; gravamos 'AAAA-MM-DD HH:MM:SS'
+    if not valor:
+        return None
+    valor = str(valor)
+    if valor[:8].isdigit():
+        return datetime.strptime(valor[:14].ljust(14, '0'), '%Y%m%d%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+    return valor[:19].replace('T', ' ')
+
+
+def eh_julgado(situacao):
+    return situacao is not None and any(term in situacao for term in terminado)
+
+
+def eh_definitivo(situacao):
+    return situacao is not None and ('definitivo' in situacao or 'baixa definitiva' in situacao)
+
+
+def processo_valido(processo):
+    # critério único de descarte, usado pela base analítica e pelas estatísticas em streaming
+    return all(processo[campo] is not None for campo in CAMPOS_OBRIGATORIOS)
+
+
+def processo_do_hit(tribunal, hit):
+    # extrai de um documento da API os campos da tabela processos, com os mesmos tratamentos do notebook
+    fonte = hit['_source']
+    orgao = fonte.get('orgaoJulgador', {})
+    classe = fonte.get('classe', {})
+    assuntos = [assunto for assunto in fonte.get('assuntos', []) if isinstance(assunto, dict)]
+
+    movimentos = fonte.get('movimentos', [])
+    ult_mov = movimentos[-1] if movimentos else None
+    situacao = ult_mov['nome'].lower() if ult_mov else None
+    ultimo_mov = normalizar_data(ult_mov['dataHora']) if ult_mov else None
+
+    data_ajuizamento = normalizar_data(fonte.get('dataAjuizamento'))
+    dias_ate_ultimo_mov = None
+    if data_ajuizamento and ultimo_mov:
+        dias_ate_ultimo_mov = (datetime.fromisoformat(ultimo_mov) - datetime.fromisoformat(data_ajuizamento)).days
+
+    # a ordem das chaves é a ordem das colunas da tabela processos
+    processo = {
+        'tribunal': tribunal,
+        'numero_processo': fonte['numeroProcesso'],
+        'grau': fonte.get('grau') or '',
+        'classe_codigo': classe.get('codigo'),
+        'classe': (classe.get('nome') or '').lower() or None,
+        'assunto': ', '.join(assunto.get('nome') or '' for assunto in assuntos).lower() or None,
+        'formato': ((fonte.get('formato') or {}).get('nome') or '').lower() or None,
+        'orgao_codigo': orgao.get('codigo'),
+        'orgao_julgador': (orgao.get('nome') or '').lower() or None,
+        'municipio': orgao.get('codigoMunicipioIBGE'),
+        'data_ajuizamento': data_ajuizamento,
+        'ultima_atualizacao': normalizar_data(fonte.get('dataHoraUltimaAtualizacao')),
+        'situacao': situacao,
+        'ultimo_mov': ultimo_mov,
+        'ano_ajuizamento': int(data_ajuizamento[:4]) if data_ajuizamento else None,
+        'julgado': int(eh_julgado(situacao)),
+        'definitivo': int(eh_definitivo(situacao)),
+        'dias_ate_ultimo_mov': dias_ate_ultimo_mov,
+    }
+    processo['valido'] = int(processo_valido(processo))
+    return processo
+
+
+def linhas_do_hit(tribunal, hit):
+    # converte um documento da API nas linhas das três tabelas
+    fonte = hit['_source']
+    processo = processo_do_hit(tribunal, hit)
+    numero_processo, grau = processo['numero_processo'], processo['grau']
+    assuntos = [assunto for assunto in fonte.get('assuntos', []) if isinstance(assunto, dict)]
+    movimentos = fonte.get('movimentos', [])
+
+    linhas_assuntos = [(tribunal, numero_processo, grau, assunto.get('codigo'), (assunto.get('nome') or '').lower() or None)
+                       for assunto in assuntos]
+
+    linhas_movimentos = [(tribunal, numero_processo, grau, normalizar_data(movimento.get('dataHora')), movimento.get('codigo'),
+                          movimento.get('nome'), json.dumps(movimento['complementosTabelados'], ensure_ascii=False)
+                          if 'complementosTabelados' in movimento else None)
+                         for movimento in movimentos]
+
+    return tuple(processo.values()), linhas_assuntos, linhas_movimentos
+
+
+def carregar_hits(con, tribunal, hits):
+    # grava (ou substitui) os processos de uma página de resultados em uma única transação;
+    # o mesmo (tribunal, número, grau) repetido na página fica só com a última ocorrência
+    por_chave = {}
+    for hit in hits:
+        linhas = linhas_do_hit(tribunal, hit)
+        por_chave[linhas[0][:3]] = linhas
+
+    processos, assuntos, movimentos = [], [], []
+    for processo, linhas_assuntos, linhas_movimentos in por_chave.values():
+        processos.append(processo)
+        assuntos.extend(linhas_assuntos)
+        movimentos.extend(linhas_movimentos)
+
+    chaves = list(por_chave)
+    with con:
+        con.executemany('delete from processo_assuntos where tribunal = ? and numero_processo = ? and grau = ?', chaves)
+        con.executemany('delete from movimentos where tribunal = ? and numero_processo = ? and grau = ?', chaves)
+        con.executemany(f'insert or replace into processos values ({", ".join("?" * len(processos[0]))})', processos)
+        con.executemany('insert into processo_assuntos values (?, ?, ?, ?, ?)', assuntos)
+        con.executemany('insert into movimentos values (?, ?, ?, ?, ?, ?, ?)', movimentos)
+    return len(processos)
+
+
+def consulta_orgao(codigo, tamanho=TAMANHO_PAGINA, campos=None):
+    # primeira página dos processos do órgão julgador, ordenada para paginar com search_after
+    # campos limita o _source devolvido, quando nem todos os dados são necessários.
+    # os documentos são indexados em lote e muitos têm o mesmo @timestamp: o search_after pula tudo que empata
+    # com o último documento da página, então o número do processo e o grau desempatam a ordenação
+    consulta = {
+        "size": tamanho,
+        "query": {
+            "match": {"orgaoJulgador.codigo": codigo}
+        },
+        "sort": [
+            {"@timestamp": {"order": "asc"}},
+            {"numeroProcesso.keyword": {"order": "asc"}},
+            {"grau": {"order": "asc"}}
+        ]
+    }
+    if campos:
+        consulta['_source'] = campos
+    return consulta
+
+
+def paginas_orgao(tribunal, codigo, tamanho=TAMANHO_PAGINA, sessao=None, campos=None):
+    # percorre todos os processos do órgão julgador com search_after (sem o limite de 10000 do "size")
+    consulta = consulta_orgao(codigo, tamanho, campos)
+    while True:
+        hits = pesquisar(tribunal, consulta, sessao=sessao)['hits']['hits']
+        if not hits:
+            return
+        yield hits
+        consulta['search_after'] = hits[-1]['sort']
+
+
+def carregar_orgao(con, tribunal, codigo, sessao=None):
+    total = 0
+    for hits in paginas_orgao(tribunal, codigo, sessao=sessao):
+        total += carregar_hits(con, tribunal, hits)
+    return total
+
+
+# # Estatísticas parametrizadas
+
+def filtros(tribunal=None, orgao_codigo=None, ano=None, julgado=None):
+    # monta a cláusula where e os parâmetros; valido (e julgado) vêm logo após o tribunal para aproveitar os índices
+    condicoes, parametros = ['valido = 1'], []
+    if tribunal is not None:
+        condicoes.insert(0, 'tribunal = ?')
+        parametros.append(tribunal)
+    for coluna, valor in (('julgado', julgado), ('orgao_codigo', orgao_codigo), ('ano_ajuizamento', ano)):
+        if valor is not None:
+            condicoes.append(f'{coluna} = ?')
+            parametros.append(valor)
+    return ' where ' + ' and '.join(condicoes), parametros
+
+
+# mesma expressão da view v_processos, aplicada direto sobre a tabela para usar os índices de cobertura
+CONTAGEM_DIAS = ("case when definitivo = 1 then dias_ate_ultimo_mov "
+                 "else cast(julianday('now') - julianday(data_ajuizamento) as integer) end")
+
+
+def media_tempo_por_assunto(con, tribunal=None, orgao_codigo=None, ano=None):
+    where, parametros = filtros(tribunal, orgao_codigo, ano, julgado=1)
+    sql = f"""
+        select assunto, count(*) as quantidade, cast(avg({CONTAGEM_DIAS}) as integer) as media_dias
+        from processos{where}
+        group by assunto
+        order by quantidade desc
+    """
+    return pd.read_sql_query(sql, con, params=parametros)
+
+
+def media_tempo_por_classe(con, tribunal=None, orgao_codigo=None, ano=None):
+    where, parametros = filtros(tribunal, orgao_codigo, ano, julgado=1)
+    sql = f"""
+        select classe, count(*) as quantidade, cast(avg({CONTAGEM_DIAS}) as integer) as media_dias
+        from processos{where}
+        group by classe
+        order by quantidade desc
+    """
+    return pd.read_sql_query(sql, con, params=parametros)
+
+
+def comparativo_ano(con, tribunal=None, orgao_codigo=None):
+    where, parametros = filtros(tribunal, orgao_codigo)
+    sql = f"""
+        select ano_ajuizamento as ano, count(*) as quantidade_ajuizados, sum(julgado) as quantidade_julgados
+        from processos{where}
+        group by ano_ajuizamento
+        order by ano_ajuizamento
+    """
+    return pd.read_sql_query(sql, con, params=parametros)
+
+
+def proporcao_julgados(con, tribunal=None, orgao_codigo=None):
+    where, parametros = filtros(tribunal, orgao_codigo)
+    sql = f"""
+        select count(*) as total_processos,
+               sum(julgado) as quantidade_julgados,
+               count(*) - sum(julgado) as quantidade_nao_julgados,
+               100.0 * sum(julgado) / count(*) as porcentagem_julgados,
+               100.0 * (count(*) - sum(julgado)) / count(*) as porcentagem_nao_julgados
+        from processos{where}
+    """
+    return pd.read_sql_query(sql, con, params=parametros)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Base analítica SQLite com processos e movimentações do DataJud.')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_carregar = subparsers.add_parser('carregar', help='carrega todos os processos de um órgão julgador')
+    parser_carregar.add_argument('--banco', default='cnj.sqlite')
+    parser_carregar.add_argument('--tribunal', default='tjpe')
+    parser_carregar.add_argument('--orgao', type=int, required=True, action='append', help='código do órgão julgador (pode repetir)')
+
+    parser_sql = subparsers.add_parser('sql', help='executa uma consulta SQL na base')
+    parser_sql.add_argument('--banco', default='cnj.sqlite')
+    parser_sql.add_argument('consulta')
+
+    args = parser.parse_args()
+    con = conectar(args.banco)
+
+    if args.comando == 'carregar':
+        for codigo in args.orgao:
+            print(f'Órgão {codigo}: {carregar_orgao(con, args.tribunal, codigo)} processos carregados')
+    else:
+        pd.set_option('display.max_rows', None)
+        print(pd.read_sql_query(args.consulta, con))
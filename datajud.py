@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Acesso à API Pública do DataJud
+#
+# Funções compartilhadas pelos scripts que consultam a API (mesmos parâmetros
+# usados no notebook principal).
+
+import os
+import json
+import gzip
+import hashlib
+from datetime import datetime
+
+import requests
+
+
+# definindo os parâmetros padrão da API
+
+URL_BASE = os.environ.get('DATAJUD_URL_BASE', 'https://api-publica.datajud.cnj.jus.br')
+
+API_KEY = os.environ.get('DATAJUD_API_KEY', 'APIKey cDZHYzlZa0JadVREZDJCendQbXY6SkJlTzNjLV9TRENyQk1RdnFKZGRQdw==')
+
+# gravação e reprodução de respostas (fixtures .json.gz)
+# DATAJUD_GRAVAR=pasta grava cada resposta real; DATAJUD_REPRODUZIR=pasta responde a partir das gravações, sem rede
+PASTA_GRAVACAO = os.environ.get('DATAJUD_GRAVAR')
+
+PASTA_REPRODUCAO = os.environ.get('DATAJUD_REPRODUZIR')
+
+
+def limpar_numero(numero_processo_bruto):
+    # remove pontuação do número CNJ, como no notebook
+    return numero_processo_bruto.replace('-', '').replace(' ', '').replace('.', '')
+
+
+def interpretar_data(valor):
+    # a API devolve datas como '2020-03-12T00:00:00.000Z' ou '20200312000000'; o fuso é descartado (UTC)
+    if not valor:
+        return None
+    valor = str(valor)
+    if valor[:8].isdigit():
+        return datetime.strptime(valor[:14].ljust(14, '0'), '%Y%m%d%H%M%S')
+    return datetime.fromisoformat(valor[:19].replace('T', ' '))
+
+
+def montar_url(tribunal, url_base=None):
+    return f"{url_base or URL_BASE}/api_publica_{tribunal}/_search"
+
+
+def montar_headers(api_key=None):
+    return {
+        'Authorization': api_key or API_KEY,
+        'Content-Type': 'application/json'
+    }
+
+
+def nome_fixture(tribunal, consulta):
+    # o nome do arquivo é derivado do tribunal e da consulta, para que a mesma consulta encontre a mesma gravação
+    chave = json.dumps([tribunal, consulta], sort_keys=True, ensure_ascii=False)
+    return f"{tribunal}_{hashlib.sha1(chave.encode('utf-8')).hexdigest()[:16]}.json.gz"
+
+
+def gravar_fixture(pasta, tribunal, consulta, resposta):
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome_fixture(tribunal, consulta))
+    with gzip.open(caminho, 'wt', encoding='utf-8') as arquivo:
+        json.dump({'tribunal': tribunal, 'consulta': consulta, 'resposta': resposta}, arquivo, ensure_ascii=False)
+    return caminho
+
+
+def ler_fixture(caminho):
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def reproduzir_fixture(pasta, tribunal, consulta):
+    caminho = os.path.join(pasta, nome_fixture(tribunal, consulta))
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f'Consulta não gravada em {pasta}: {json.dumps(consulta, ensure_ascii=False)[:200]}')
+    return ler_fixture(caminho)['resposta']
+
+
+def pesquisar(tribunal, consulta, sessao=None, api_key=None, url_base=None, timeout=60):
+    # envia a consulta para o endpoint _search do tribunal e devolve o json
+    if PASTA_REPRODUCAO:
+        return reproduzir_fixture(PASTA_REPRODUCAO, tribunal, consulta)
+
+    sessao = sessao or requests
+    response = sessao.request("POST", montar_url(tribunal, url_base), headers=montar_headers(api_key),
+                              data=json.dumps(consulta), timeout=timeout)
+    response.raise_for_status()
+    resposta = response.json()
+
+    if PASTA_GRAVACAO:
+        gravar_fixture(PASTA_GRAVACAO, tribunal, consulta, resposta)
+    return resposta
@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Estatísticas em Streaming (memória limitada)
+#
+# ### Calcula as estatísticas da Etapa de Análise página por página, sem montar o DataFrame do órgão inteiro, para analisar tribunais maiores que a memória disponível.
+#
+# ## Funcionalidades:
+#     - Acumuladores combináveis: contagens, somas, média/variância de Welford e esboço de quantis (histograma logarítmico com erro relativo fixo).
+#     - Mesmas saídas dos groupbys do notebook: proporção de julgados, media_tempo_por_assunto/classe, comparativo_ano e tempo para julgar.
+#     - Resultados parciais gravados em JSON, que podem ser combinados (ex.: um worker por órgão julgador e depois o total do tribunal).
+#
+# Uso:
+#     python estatisticas_streaming.py processar --tribunal tjpe --orgao 1234 --saida parcial_1234.json
+#     python estatisticas_streaming.py combinar --saida tjpe.json parcial_*.json
+#     python estatisticas_streaming.py relatorio tjpe.json
+
+import argparse
+import json
+import math
+from collections import Counter
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from base_analitica import paginas_orgao, processo_do_hit, processo_valido
+
+
+# campos do _source usados nas estatísticas (reduz o tamanho de cada página)
+CAMPOS = ['numeroProcesso', 'grau', 'classe', 'assuntos', 'formato', 'orgaoJulgador', 'dataAjuizamento',
+          'dataHoraUltimaAtualizacao', 'movimentos']
+
+
+# # Acumuladores
+
+class MediaVariancia:
+    # média e variância de Welford; a soma exata é mantida para reproduzir o mean() do pandas
+    def __init__(self):
+        self.n = 0
+        self.soma = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def adicionar(self, valor):
+        self.n += 1
+        self.soma += valor
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+
+    def combinar(self, outro):
+        # fórmula de Chan et al. para juntar duas partições
+        if outro.n == 0:
+            return self
+        n = self.n + outro.n
+        delta = outro.media - self.media
+        self.media += delta * outro.n / n
+        self.m2 += outro.m2 + delta * delta * self.n * outro.n / n
+        self.n = n
+        self.soma += outro.soma
+        return self
+
+    def valor_medio(self):
+        return self.soma / self.n if self.n else float('nan')
+
+    def variancia(self):
+        # variância amostral (ddof=1), como o var() do pandas
+        return self.m2 / (self.n - 1) if self.n > 1 else float('nan')
+
+    def para_dict(self):
+        return {'n': self.n, 'soma': self.soma, 'media': self.media, 'm2': self.m2}
+
+    @classmethod
+    def de_dict(cls, dados):
+        acumulador = cls()
+        acumulador.n, acumulador.soma, acumulador.media, acumulador.m2 = dados['n'], dados['soma'], dados['media'], dados['m2']
+        return acumulador
+
+
+class EsbocoQuantis:
+    # histograma com baldes logarítmicos: qualquer quantil tem erro relativo de no máximo alpha,
+    # a memória cresce com o log do maior valor e dois esboços com o mesmo alpha se combinam somando os baldes
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.positivos = Counter()
+        self.negativos = Counter()
+        self.zeros = 0
+        self.n = 0
+
+    def indice(self, valor):
+        return math.ceil(math.log(valor) / self.log_gamma)
+
+    def valor_do_indice(self, indice):
+        return 2 * self.gamma ** indice / (self.gamma + 1)
+
+    def adicionar(self, valor):
+        self.n += 1
+        if valor > 0:
+            self.positivos[self.indice(valor)] += 1
+        elif valor < 0:
+            self.negativos[self.indice(-valor)] += 1
+        else:
+            self.zeros += 1
+
+    def combinar(self, outro):
+        if outro.alpha != self.alpha:
+            raise ValueError('Esboços com alpha diferentes não podem ser combinados')
+        self.positivos.update(outro.positivos)
+        self.negativos.update(outro.negativos)
+        self.zeros += outro.zeros
+        self.n += outro.n
+        return self
+
+    def quantil(self, q):
+        if not self.n:
+            return float('nan')
+        posicao = q * (self.n - 1)
+        acumulado = 0
+        for indice in sorted(self.negativos, reverse=True):
+            acumulado += self.negativos[indice]
+            if acumulado > posicao:
+                return -self.valor_do_indice(indice)
+        acumulado += self.zeros
+        if acumulado > posicao:
+            return 0
+        for indice in sorted(self.positivos):
+            acumulado += self.positivos[indice]
+            if acumulado > posicao:
+                return self.valor_do_indice(indice)
+        return self.valor_do_indice(max(self.positivos))
+
+    def para_dict(self):
+        return {'alpha': self.alpha, 'zeros': self.zeros, 'n': self.n,
+                'positivos': {str(indice): contagem for indice, contagem in self.positivos.items()},
+                'negativos': {str(indice): contagem for indice, contagem in self.negativos.items()}}
+
+    @classmethod
+    def de_dict(cls, dados):
+        esboco = cls(dados['alpha'])
+        esboco.zeros, esboco.n = dados['zeros'], dados['n']
+        esboco.positivos = Counter({int(indice): contagem for indice, contagem in dados['positivos'].items()})
+        esboco.negativos = Counter({int(indice): contagem for indice, contagem in dados['negativos'].items()})
+        return esboco
+
+
+def combinar_grupos(grupos, outros):
+    for chave, acumulador in outros.items():
+        if chave in grupos:
+            grupos[chave].combinar(acumulador)
+        else:
+            grupos[chave] = acumulador
+    return grupos
+
+
+class EstatisticasStreaming:
+    # estado completo da Etapa de Análise para um conjunto de processos, atualizado página a página
+    def __init__(self, agora=None, alpha=0.01):
+        # "agora" fixo, para que shards processados em momentos diferentes contem os dias da mesma forma
+        self.agora = agora or datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
+        self.total = 0
+        self.julgados = 0
+        self.fisicos = 0
+        self.descartados = 0
+        self.contagem_dias = MediaVariancia()
+        self.por_assunto = {}
+        self.por_classe = {}
+        self.por_assunto_julgados = {}
+        self.por_classe_julgados = {}
+        self.ajuizados_por_ano = Counter()
+        self.julgados_por_ano = Counter()
+        self.tempo_para_julgar = MediaVariancia()
+        self.quantis_tempo_para_julgar = EsbocoQuantis(alpha)
+
+    def adicionar_processo(self, processo):
+        # mesmo critério de descarte da base analítica (dropna do notebook)
+        if not processo_valido(processo):
+            self.descartados += 1
+            return
+
+        if processo['definitivo']:
+            contagem_dias = processo['dias_ate_ultimo_mov']
+        else:
+            contagem_dias = (datetime.fromisoformat(self.agora) - datetime.fromisoformat(processo['data_ajuizamento'])).days
+
+        self.total += 1
+        self.fisicos += processo['formato'] == 'físico'
+        self.contagem_dias.adicionar(contagem_dias)
+        self.por_assunto.setdefault(processo['assunto'], MediaVariancia()).adicionar(contagem_dias)
+        self.por_classe.setdefault(processo['classe'], MediaVariancia()).adicionar(contagem_dias)
+        self.ajuizados_por_ano[processo['ano_ajuizamento']] += 1
+
+        if processo['julgado']:
+            self.julgados += 1
+            self.por_assunto_julgados.setdefault(processo['assunto'], MediaVariancia()).adicionar(contagem_dias)
+            self.por_classe_julgados.setdefault(processo['classe'], MediaVariancia()).adicionar(contagem_dias)
+            self.julgados_por_ano[processo['ano_ajuizamento']] += 1
+            self.tempo_para_julgar.adicionar(processo['dias_ate_ultimo_mov'])
+            self.quantis_tempo_para_julgar.adicionar(processo['dias_ate_ultimo_mov'])
+
+    def adicionar_hits(self, tribunal, hits):
+        for hit in hits:
+            self.adicionar_processo(processo_do_hit(tribunal, hit))
+        return self
+
+    def combinar(self, outro):
+        # contagem_dias dos não definitivos depende de "agora"; parciais com datas diferentes não são somáveis
+        if outro.agora != self.agora:
+            raise ValueError(f'Parciais com datas de referência diferentes ({self.agora} e {outro.agora}); '
+                             'processe todos os shards com o mesmo --agora')
+        self.total += outro.total
+        self.julgados += outro.julgados
+        self.fisicos += outro.fisicos
+        self.descartados += outro.descartados
+        self.contagem_dias.combinar(outro.contagem_dias)
+        combinar_grupos(self.por_assunto, outro.por_assunto)
+        combinar_grupos(self.por_classe, outro.por_classe)
+        combinar_grupos(self.por_assunto_julgados, outro.por_assunto_julgados)
+        combinar_grupos(self.por_classe_julgados, outro.por_classe_julgados)
+        self.ajuizados_por_ano.update(outro.ajuizados_por_ano)
+        self.julgados_por_ano.update(outro.julgados_por_ano)
+        self.tempo_para_julgar.combinar(outro.tempo_para_julgar)
+        self.quantis_tempo_para_julgar.combinar(outro.quantis_tempo_para_julgar)
+        return self
+
+    # ## Saídas equivalentes ao notebook
+
+    def proporcao_julgados(self):
+        return {
+            'quantidade_julgados': self.julgados,
+            'quantidade_nao_julgados': self.total - self.julgados,
+            'total_processos': self.total,
+            'porcentagem_julgados': self.julgados / self.total * 100 if self.total else float('nan'),
+            'porcentagem_nao_julgados': (self.total - self.julgados) / self.total * 100 if self.total else float('nan'),
+            'porcentagem_processos_fisicos': self.fisicos / self.total * 100 if self.total else float('nan'),
+        }
+
+    def media_tempo(self, grupos, nome, top=None):
+        # equivalente a df.groupby(nome)['contagem_dias'].mean().astype(int);
+        # com top, repete o filtro dos gráficos (os mais frequentes, ordenados pela média)
+        medias = pd.Series({chave: int(acumulador.valor_medio()) for chave, acumulador in grupos.items()}, dtype='int64')
+        medias.index.name = nome
+        medias.name = 'contagem_dias'
+        if top is None:
+            return medias.sort_index()
+        frequentes = sorted(grupos, key=lambda chave: grupos[chave].n, reverse=True)[:top]
+        return medias.loc[frequentes].sort_values(ascending=False)
+
+    def media_tempo_por_assunto(self, apenas_julgados=True, top=None):
+        return self.media_tempo(self.por_assunto_julgados if apenas_julgados else self.por_assunto, 'assunto', top)
+
+    def media_tempo_por_classe(self, apenas_julgados=True, top=None):
+        return self.media_tempo(self.por_classe_julgados if apenas_julgados else self.por_classe, 'classe', top)
+
+    def media_tempo_geral(self):
+        return int(self.contagem_dias.valor_medio())
+
+    def comparativo_ano(self):
+        anos = sorted(self.ajuizados_por_ano)
+        return pd.DataFrame({
+            'ano': anos,
+            'quantidade_ajuizados': [self.ajuizados_por_ano[ano] for ano in anos],
+            'quantidade_julgados': [float(self.julgados_por_ano.get(ano, 0)) for ano in anos],
+        })
+
+    def resumo_tempo_para_julgar(self, quantis=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        resumo = {'media': self.tempo_para_julgar.valor_medio(), 'desvio_padrao': math.sqrt(self.tempo_para_julgar.variancia())
+                  if self.tempo_para_julgar.n > 1 else float('nan')}
+        for q in quantis:
+            resumo[f'p{int(q * 100)}'] = self.quantis_tempo_para_julgar.quantil(q)
+        return resumo
+
+    # ## Persistência dos parciais
+
+    def para_dict(self):
+        def grupos(acumuladores):
+            return {chave: acumulador.para_dict() for chave, acumulador in acumuladores.items()}
+
+        return {
+            'agora': self.agora, 'total': self.total, 'julgados': self.julgados, 'fisicos': self.fisicos,
+            'descartados': self.descartados, 'contagem_dias': self.contagem_dias.para_dict(),
+            'por_assunto': grupos(self.por_assunto), 'por_classe': grupos(self.por_classe),
+            'por_assunto_julgados': grupos(self.por_assunto_julgados), 'por_classe_julgados': grupos(self.por_classe_julgados),
+            'ajuizados_por_ano': {str(ano): quantidade for ano, quantidade in self.ajuizados_por_ano.items()},
+            'julgados_por_ano': {str(ano): quantidade for ano, quantidade in self.julgados_por_ano.items()},
+            'tempo_para_julgar': self.tempo_para_julgar.para_dict(),
+            'quantis_tempo_para_julgar': self.quantis_tempo_para_julgar.para_dict(),
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        def grupos(acumuladores):
+            return {chave: MediaVariancia.de_dict(acumulador) for chave, acumulador in acumuladores.items()}
+
+        estatisticas = cls(dados['agora'])
+        estatisticas.total, estatisticas.julgados = dados['total'], dados['julgados']
+        estatisticas.fisicos, estatisticas.descartados = dados['fisicos'], dados['descartados']
+        estatisticas.contagem_dias = MediaVariancia.de_dict(dados['contagem_dias'])
+        estatisticas.por_assunto = grupos(dados['por_assunto'])
+        estatisticas.por_classe = grupos(dados['por_classe'])
+        estatisticas.por_assunto_julgados = grupos(dados['por_assunto_julgados'])
+        estatisticas.por_classe_julgados = grupos(dados['por_classe_julgados'])
+        estatisticas.ajuizados_por_ano = Counter({int(ano): quantidade for ano, quantidade in dados['ajuizados_por_ano'].items()})
+        estatisticas.julgados_por_ano = Counter({int(ano): quantidade for ano, quantidade in dados['julgados_por_ano'].items()})
+        estatisticas.tempo_para_julgar = MediaVariancia.de_dict(dados['tempo_para_julgar'])
+        estatisticas.quantis_tempo_para_julgar = EsbocoQuantis.de_dict(dados['quantis_tempo_para_julgar'])
+        return estatisticas
+
+    def salvar(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.para_dict(), arquivo, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with open(caminho, encoding='utf-8') as arquivo:
+            return cls.de_dict(json.load(arquivo))
+
+
+def processar_orgao(tribunal, codigo, estatisticas=None, sessao=None):
+    # consome o órgão página por página; só uma página fica em memória por vez
+    estatisticas = estatisticas or EstatisticasStreaming()
+    for hits in paginas_orgao(tribunal, codigo, sessao=sessao, campos=CAMPOS):
+        estatisticas.adicionar_hits(tribunal, hits)
+    return estatisticas
+
+
+def imprimir_relatorio(estatisticas):
+    proporcao = estatisticas.proporcao_julgados()
+    print(f"Porcentagem de processos físicos: {proporcao['porcentagem_processos_fisicos']:.2f}%")
+    print(f"Quantidade de processos julgados: {proporcao['quantidade_julgados']}")
+    print(f"Porcentagem de processos julgados: {proporcao['porcentagem_julgados']:.2f}%")
+    print(f"Quantidade de processos não julgados: {proporcao['quantidade_nao_julgados']}")
+    print(f"Porcentagem de processos não julgados: {proporcao['porcentagem_nao_julgados']:.2f}%")
+    print(f"Processos descartados (dados incompletos): {estatisticas.descartados}")
+    print("\nMédia de tempo para julgar por assunto (15 mais frequentes):")
+    print(estatisticas.media_tempo_por_assunto(top=15))
+    print("\nMédia de tempo para julgar por classe (15 mais frequentes):")
+    print(estatisticas.media_tempo_por_classe(top=15))
+    print("\nQuantidade de processos ajuizados e julgados por ano:")
+    print(estatisticas.comparativo_ano())
+    print("\nTempo para julgar (dias):")
+    print(estatisticas.resumo_tempo_para_julgar())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Estatísticas da Etapa de Análise calculadas em streaming.')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_processar = subparsers.add_parser('processar', help='processa um ou mais órgãos julgadores e grava o parcial')
+    parser_processar.add_argument('--tribunal', default='tjpe')
+    parser_processar.add_argument('--orgao', type=int, required=True, action='append', help='código do órgão julgador (pode repetir)')
+    parser_processar.add_argument('--agora', default=datetime.now(timezone.utc).strftime('%Y-%m-%d 00:00:00'),
+                                  help='data de referência para a contagem de dias (AAAA-MM-DD HH:MM:SS); '
+                                       'padrão: hoje à meia-noite UTC. Use o mesmo valor em todos os shards')
+    parser_processar.add_argument('--saida', required=True)
+
+    parser_combinar = subparsers.add_parser('combinar', help='combina parciais gravados por processar')
+    parser_combinar.add_argument('--saida', required=True)
+    parser_combinar.add_argument('parciais', nargs='+')
+
+    parser_relatorio = subparsers.add_parser('relatorio', help='imprime as estatísticas de um parcial')
+    parser_relatorio.add_argument('parcial')
+
+    args = parser.parse_args()
+
+    if args.comando == 'processar':
+        estatisticas = EstatisticasStreaming(args.agora)
+        for codigo in args.orgao:
+            processar_orgao(args.tribunal, codigo, estatisticas)
+        estatisticas.salvar(args.saida)
+        imprimir_relatorio(estatisticas)
+    elif args.comando == 'combinar':
+        estatisticas = EstatisticasStreaming.carregar(args.parciais[0])
+        for caminho in args.parciais[1:]:
+            estatisticas.combinar(EstatisticasStreaming.carregar(caminho))
+        estatisticas.salvar(args.saida)
+        imprimir_relatorio(estatisticas)
+    else:
+        imprimir_relatorio(EstatisticasStreaming.carregar(args.parcial))
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Monitoramento de Carteira de Processos
+#
+# ### Acompanha uma carteira de processos e avisa quando surgem novas movimentações, sem precisar rodar o notebook inteiro de novo.
+#
+# ## Funcionamento:
+#     - Consulta barata em lote: pede apenas `numeroProcesso` e `dataHoraUltimaAtualizacao` de vários processos por requisição.
+#     - Só busca as movimentações completas dos processos cuja data de atualização mudou.
+#     - Compara com a data e as impressões (hashes) do último movimento guardadas no arquivo de estado e emite eventos de novo movimento (JSONL e/ou webhook).
+#     - Intervalo de consulta adaptativo por processo: processos movimentados voltam ao intervalo mínimo, parados vão espaçando até o máximo.
+#
+# Uso:
+#     python monitoramento.py --tribunal tjpe --carteira carteira.txt --eventos eventos.jsonl
+#     python monitoramento.py --tribunal tjpe --carteira carteira.txt --webhook http://localhost:8000/eventos --uma-vez
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from datajud import limpar_numero, pesquisar
+
+
+# processos por requisição na consulta de atualização (projeção pequena)
+TAMANHO_LOTE = 1000
+
+# processos por requisição na busca das movimentações completas (documentos grandes)
+TAMANHO_LOTE_MOVIMENTOS = 100
+
+# um mesmo número pode aparecer em mais de um documento (ex.: 1º e 2º grau)
+DOCUMENTOS_POR_PROCESSO = 3
+
+# intervalos de consulta, em segundos
+INTERVALO_MINIMO = 15 * 60
+INTERVALO_MAXIMO = 24 * 60 * 60
+
+# espera após um ciclo com erro, dobrada a cada erro seguido (até o intervalo mínimo), em segundos
+ESPERA_ERRO = 30
+
+
+def lotes(itens, tamanho):
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+def chave_movimento(movimento):
+    # identifica um movimento pela data, código e nome
+    return f"{movimento.get('dataHora')}|{movimento.get('codigo')}|{movimento.get('nome')}"
+
+
+def impressao(chave):
+    # hash curto da chave do movimento, para não guardar o texto no estado
+    return hashlib.blake2b(chave.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def resumir_movimentos(chaves):
+    # estado compacto de um processo: data do movimento mais recente, impressões dos movimentos nessa data e total
+    ultimo = max((chave.split('|', 1)[0] for chave in chaves), default='')
+    return {
+        'ultimo_movimento': ultimo,
+        'impressoes': sorted(impressao(chave) for chave in chaves if chave.split('|', 1)[0] == ultimo),
+        'quantidade': len(chaves),
+    }
+
+
+def novos_movimentos(registro, movimentos):
+    # movimentos posteriores ao último conhecido (ou na mesma data, mas ainda não vistos)
+    ultimo = registro['ultimo_movimento']
+    impressoes = set(registro['impressoes'])
+    novos = {}
+    for movimento in movimentos:
+        chave = chave_movimento(movimento)
+        data = chave.split('|', 1)[0]
+        if data > ultimo or (data == ultimo and impressao(chave) not in impressoes):
+            novos[chave] = movimento
+    return list(novos.values())
+
+
+def consultar_atualizacoes(tribunal, numeros, sessao=None):
+    # retorna {numero: maior dataHoraUltimaAtualizacao entre os documentos do processo}
+    consulta = {
+        "size": min(len(numeros) * DOCUMENTOS_POR_PROCESSO, 10000),
+        "_source": ["numeroProcesso", "dataHoraUltimaAtualizacao"],
+        "query": {
+            "terms": {"numeroProcesso.keyword": numeros}
+        }
+    }
+    dados_dict = pesquisar(tribunal, consulta, sessao=sessao)
+
+    atualizacoes = {}
+    for processo in dados_dict['hits']['hits']:
+        numero = processo['_source']['numeroProcesso']
+        data = processo['_source'].get('dataHoraUltimaAtualizacao')
+        if data and (numero not in atualizacoes or data > atualizacoes[numero]):
+            atualizacoes[numero] = data
+    return atualizacoes
+
+
+def buscar_movimentos(tribunal, numeros, sessao=None):
+    # retorna {numero: lista de movimentos}, juntando os documentos do mesmo processo
+    consulta = {
+        "size": min(len(numeros) * DOCUMENTOS_POR_PROCESSO, 10000),
+        "_source": ["numeroProcesso", "movimentos"],
+        "query": {
+            "terms": {"numeroProcesso.keyword": numeros}
+        }
+    }
+    dados_dict = pesquisar(tribunal, consulta, sessao=sessao)
+
+    movimentos = {}
+    for processo in dados_dict['hits']['hits']:
+        numero = processo['_source']['numeroProcesso']
+        movimentos.setdefault(numero, []).extend(processo['_source'].get('movimentos', []))
+    return movimentos
+
+
+def carregar_carteira(caminho):
+    # um número de processo por linha, com ou sem pontuação
+    with open(caminho, encoding='utf-8') as arquivo:
+        numeros = [limpar_numero(linha.strip()) for linha in arquivo if linha.strip()]
+    return list(dict.fromkeys(numeros))
+
+
+def carregar_estado(caminho):
+    if not os.path.exists(caminho):
+        return {'processos': {}}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def salvar_estado(estado, caminho):
+    # grava em arquivo temporário e renomeia, para não corromper o estado se o processo morrer no meio
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(estado, arquivo, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporario, caminho)
+
+
+def emitir_eventos(eventos, caminho_eventos=None, webhook=None, sessao=None):
+    if not eventos:
+        return
+
+    if caminho_eventos:
+        with open(caminho_eventos, 'a', encoding='utf-8') as arquivo:
+            for evento in eventos:
+                arquivo.write(json.dumps(evento, ensure_ascii=False) + '\n')
+
+    if webhook:
+        sessao = sessao or requests
+        try:
+            sessao.request("POST", webhook, json={'eventos': eventos}, timeout=30)
+        except requests.RequestException as erro:
+            print(f'Erro ao enviar eventos para o webhook: {erro}')
+
+
+def proximo_intervalo(intervalo_atual, houve_movimento, intervalo_minimo=INTERVALO_MINIMO, intervalo_maximo=INTERVALO_MAXIMO):
+    # processo ativo volta ao mínimo; processo parado dobra o intervalo até o máximo
+    if houve_movimento or not intervalo_atual:
+        return intervalo_minimo
+    return min(intervalo_atual * 2, intervalo_maximo)
+
+
+def evento_movimento(tribunal, numero, movimento):
+    return {
+        'evento': 'novo_movimento',
+        'tribunal': tribunal,
+        'numero_processo': numero,
+        'data': movimento.get('dataHora'),
+        'codigo': movimento.get('codigo'),
+        'descricao_movimento': movimento.get('nome'),
+        'detectado_em': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def executar_ciclo(tribunal, carteira, estado, sessao=None, agora=None, ao_emitir=None,
+                   intervalo_minimo=INTERVALO_MINIMO, intervalo_maximo=INTERVALO_MAXIMO):
+    # consulta os processos com consulta vencida e devolve a lista de eventos de novos movimentos.
+    # com ao_emitir, os eventos de cada sublote são entregues antes de o estado registrá-los como conhecidos,
+    # para que uma falha em um sublote seguinte não faça perder eventos já detectados
+    agora = agora if agora is not None else time.time()
+    processos = estado['processos']
+
+    devidos = [numero for numero in carteira if processos.get(numero, {}).get('proxima_consulta', 0) <= agora]
+
+    eventos = []
+    for lote in lotes(devidos, TAMANHO_LOTE):
+        atualizacoes = consultar_atualizacoes(tribunal, lote, sessao=sessao)
+
+        alterados = [numero for numero in lote
+                     if numero in atualizacoes and atualizacoes[numero] != processos.get(numero, {}).get('ultima_atualizacao')]
+
+        movimentados = set()
+        for sublote in lotes(alterados, TAMANHO_LOTE_MOVIMENTOS):
+            movimentos_por_processo = buscar_movimentos(tribunal, sublote, sessao=sessao)
+
+            eventos_sublote = []
+            atualizados = {}
+            for numero in sublote:
+                registro = processos.get(numero, {})
+                movimentos = movimentos_por_processo.get(numero, [])
+                chaves = {chave_movimento(movimento) for movimento in movimentos}
+                atualizados[numero] = dict(resumir_movimentos(chaves), ultima_atualizacao=atualizacoes[numero])
+
+                # na primeira consulta apenas guardamos o histórico, sem emitir eventos
+                if 'quantidade' not in registro:
+                    continue
+
+                novos = novos_movimentos(registro, movimentos)
+                for movimento in novos:
+                    eventos_sublote.append(evento_movimento(tribunal, numero, movimento))
+
+                # movimentos incluídos com data anterior ao último conhecido só aparecem no total
+                retroativos = len(chaves) - registro['quantidade'] - len(novos)
+                if retroativos > 0:
+                    eventos_sublote.append({
+                        'evento': 'movimentos_retroativos',
+                        'tribunal': tribunal,
+                        'numero_processo': numero,
+                        'quantidade': retroativos,
+                        'detectado_em': datetime.now(timezone.utc).isoformat(),
+                    })
+                if novos or retroativos > 0:
+                    movimentados.add(numero)
+
+            if ao_emitir:
+                ao_emitir(eventos_sublote)
+            eventos.extend(eventos_sublote)
+
+            for numero, resumo in atualizados.items():
+                processos.setdefault(numero, {}).update(resumo)
+
+        for numero in lote:
+            registro = processos.setdefault(numero, {})
+            registro['intervalo'] = proximo_intervalo(registro.get('intervalo'), numero in movimentados,
+                                                      intervalo_minimo, intervalo_maximo)
+            registro['proxima_consulta'] = agora + registro['intervalo']
+
+    return eventos
+
+
+def espera_apos_erro(erro, erros_seguidos, espera_maxima=INTERVALO_MINIMO):
+    # recuo exponencial após erros seguidos; o Retry-After de um 429/503 prevalece se for maior
+    espera = min(ESPERA_ERRO * 2 ** (erros_seguidos - 1), espera_maxima)
+    resposta = getattr(erro, 'response', None)
+    if resposta is not None:
+        try:
+            espera = max(espera, float(resposta.headers.get('Retry-After')))
+        except (TypeError, ValueError):
+            pass
+    return espera
+
+
+def monitorar(tribunal, caminho_carteira, caminho_estado, caminho_eventos=None, webhook=None, uma_vez=False,
+              intervalo_minimo=INTERVALO_MINIMO, intervalo_maximo=INTERVALO_MAXIMO):
+    sessao = requests.Session()
+    estado = carregar_estado(caminho_estado)
+    erros_seguidos = 0
+
+    while True:
+        # relê a carteira a cada ciclo, para aceitar inclusões sem reiniciar
+        carteira = carregar_carteira(caminho_carteira)
+
+        eventos = []
+
+        def ao_emitir(eventos_sublote):
+            emitir_eventos(eventos_sublote, caminho_eventos, webhook, sessao=sessao)
+            eventos.extend(eventos_sublote)
+
+        espera_erro = 0
+        try:
+            executar_ciclo(tribunal, carteira, estado, sessao=sessao, ao_emitir=ao_emitir,
+                           intervalo_minimo=intervalo_minimo, intervalo_maximo=intervalo_maximo)
+            erros_seguidos = 0
+        except requests.RequestException as erro:
+            print(f'Erro na requisição: {erro}')
+            # os processos do lote que falhou continuam vencidos: sem esta espera o ciclo seguinte seria imediato
+            erros_seguidos += 1
+            espera_erro = espera_apos_erro(erro, erros_seguidos, intervalo_minimo)
+
+        salvar_estado(estado, caminho_estado)
+        print(f'{datetime.now():%d/%m/%Y %H:%M:%S} - {len(eventos)} novos movimentos')
+
+        if uma_vez:
+            return
+
+        # dorme até o próximo processo com consulta vencida
+        proximas = [registro['proxima_consulta'] for registro in estado['processos'].values() if 'proxima_consulta' in registro]
+        espera = min(proximas) - time.time() if proximas else intervalo_minimo
+        time.sleep(max(espera, espera_erro, 1))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monitora uma carteira de processos e emite eventos de novas movimentações.')
+    parser.add_argument('--tribunal', default='tjpe')
+    parser.add_argument('--carteira', required=True, help='arquivo com um número de processo por linha')
+    parser.add_argument('--estado', default='estado_monitoramento.json', help='arquivo com as movimentações já conhecidas')
+    parser.add_argument('--eventos', default='eventos.jsonl', help='arquivo JSONL onde os eventos são acrescentados')
+    parser.add_argument('--webhook', help='URL que recebe os eventos via POST')
+    parser.add_argument('--intervalo-minimo', type=int, default=INTERVALO_MINIMO, help='em segundos')
+    parser.add_argument('--intervalo-maximo', type=int, default=INTERVALO_MAXIMO, help='em segundos')
+    parser.add_argument('--uma-vez', action='store_true', help='executa um único ciclo e sai')
+    args = parser.parse_args()
+
+    monitorar(args.tribunal, args.carteira, args.estado, args.eventos, args.webhook, args.uma_vez,
+              args.intervalo_minimo, args.intervalo_maximo)
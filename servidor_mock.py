@@ -0,0 +1,454 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Servidor Local que Simula a API do DataJud
+#
+# ### Responde ao endpoint `/api_publica_{tribunal}/_search` a partir de um acervo de fixtures gravadas, para desenvolver e medir desempenho sem depender da API real.
+#
+# ## Funcionalidades:
+#     - Acervo: todos os documentos (`hits`) das fixtures `.json.gz` gravadas com DATAJUD_GRAVAR (ou arquivos `.jsonl`/`.jsonl.gz` com um `_source` por linha).
+#     - Consultas: `term`, `terms`, `match`, `range` e `bool` (must/filter/should/must_not), `_source`, `size`, `from`, `sort` (com `missing`) e `search_after`.
+#     - Agregações: `terms`, `date_histogram` (ano/mês/dia), `value_count`, `min`, `max`, `avg` e `sum`, com sub-agregações.
+#     - Latência configurável e injeção de erros (429/503) para medir vazão, repetição e paginação.
+#
+# Uso:
+#     python servidor_mock.py --fixtures fixtures/ --porta 8080 --latencia 50 --taxa-erro 0.05
+#     DATAJUD_URL_BASE=http://localhost:8080 python monitoramento.py ...
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from datajud import interpretar_data, ler_fixture
+
+
+ROTA_PESQUISA = re.compile(r'^/api_publica_(?P<tribunal>[a-z0-9]+)/_search/?$')
+
+
+# # Acervo
+
+def carregar_acervo(pasta):
+    # retorna {tribunal: lista de documentos}; o mesmo _id visto em várias fixtures vira um só documento,
+    # com os campos de _source de todas elas (respostas com _source projetado não escondem o documento completo)
+    acervo = {}
+    por_id = {}
+
+    for caminho in sorted(glob.glob(os.path.join(pasta, '*.json.gz'))):
+        fixture = ler_fixture(caminho)
+        for documento in fixture['resposta'].get('hits', {}).get('hits', []):
+            fonte = documento.get('_source', {})
+            identificador = (fixture['tribunal'], documento.get('_id') or json.dumps(fonte, sort_keys=True))
+            if identificador in por_id:
+                por_id[identificador]['_source'].update(fonte)
+                continue
+            documento = {'_id': documento.get('_id'), '_source': dict(fonte)}
+            por_id[identificador] = documento
+            acervo.setdefault(fixture['tribunal'], []).append(documento)
+
+    # arquivos {tribunal}.jsonl(.gz) com um _source por linha, para montar acervos sintéticos
+    for caminho in sorted(glob.glob(os.path.join(pasta, '*.jsonl')) + glob.glob(os.path.join(pasta, '*.jsonl.gz'))):
+        tribunal = os.path.basename(caminho).split('.')[0]
+        abrir = gzip.open if caminho.endswith('.gz') else open
+        with abrir(caminho, 'rt', encoding='utf-8') as arquivo:
+            for i, linha in enumerate(arquivo):
+                if linha.strip():
+                    acervo.setdefault(tribunal, []).append({'_id': f'{tribunal}_{i}', '_source': json.loads(linha)})
+
+    return acervo
+
+
+# # Avaliação das consultas
+
+def valores_campo(fonte, campo):
+    # devolve todos os valores de um campo com caminho pontuado, percorrendo listas (ex.: assuntos.nome)
+    if campo.endswith('.keyword'):
+        campo = campo[:-len('.keyword')]
+
+    valores = [fonte]
+    for parte in campo.split('.'):
+        proximos = []
+        for valor in valores:
+            if isinstance(valor, list):
+                proximos.extend(item.get(parte) for item in valor if isinstance(item, dict))
+            elif isinstance(valor, dict):
+                proximos.append(valor.get(parte))
+        valores = [valor for valor in proximos if valor is not None]
+
+    achatados = []
+    for valor in valores:
+        achatados.extend(valor if isinstance(valor, list) else [valor])
+    return achatados
+
+
+def iguais(valor, esperado):
+    # a API compara códigos numéricos e textos sem se importar com o tipo enviado
+    return valor == esperado or str(valor) == str(esperado)
+
+
+@lru_cache(maxsize=100000)
+def valor_comparavel(valor):
+    # datas (ISO ou compactas, como devolve a API) são comparadas como datas; os demais valores como vieram
+    if isinstance(valor, str):
+        try:
+            return interpretar_data(valor)
+        except ValueError:
+            pass
+    return valor
+
+
+def extrair_campo_valor(clausula):
+    # aceita {"campo": valor} e {"campo": {"value"/"query": valor}}
+    campo, valor = next(iter(clausula.items()))
+    if isinstance(valor, dict):
+        valor = valor.get('value', valor.get('query'))
+    return campo, valor
+
+
+def corresponde(fonte, consulta):
+    if not consulta or 'match_all' in consulta:
+        return True
+
+    if 'term' in consulta:
+        campo, esperado = extrair_campo_valor(consulta['term'])
+        return any(iguais(valor, esperado) for valor in valores_campo(fonte, campo))
+
+    if 'terms' in consulta:
+        campo, esperados = next(iter(consulta['terms'].items()))
+        esperados = {str(esperado) for esperado in esperados}
+        return any(str(valor) in esperados for valor in valores_campo(fonte, campo))
+
+    if 'match' in consulta:
+        campo, esperado = extrair_campo_valor(consulta['match'])
+        palavras = str(esperado).lower().split()
+        for valor in valores_campo(fonte, campo):
+            if iguais(valor, esperado) or (isinstance(valor, str) and any(palavra in valor.lower().split() for palavra in palavras)):
+                return True
+        return False
+
+    if 'range' in consulta:
+        campo, limites = next(iter(consulta['range'].items()))
+        limites = {operador: valor_comparavel(limite) for operador, limite in limites.items() if operador in ('gte', 'gt', 'lte', 'lt')}
+        for valor in map(valor_comparavel, valores_campo(fonte, campo)):
+            if (('gte' not in limites or valor >= limites['gte']) and ('gt' not in limites or valor > limites['gt'])
+                    and ('lte' not in limites or valor <= limites['lte']) and ('lt' not in limites or valor < limites['lt'])):
+                return True
+        return False
+
+    if 'bool' in consulta:
+        booleana = consulta['bool']
+
+        def lista(chave):
+            clausulas = booleana.get(chave, [])
+            return clausulas if isinstance(clausulas, list) else [clausulas]
+
+        if not all(corresponde(fonte, clausula) for clausula in lista('must') + lista('filter')):
+            return False
+        if any(corresponde(fonte, clausula) for clausula in lista('must_not')):
+            return False
+        # sem must/filter, ao menos uma cláusula should precisa corresponder
+        if lista('should') and ('minimum_should_match' in booleana or not (lista('must') or lista('filter'))):
+            minimo = int(booleana.get('minimum_should_match', 1))
+            return sum(corresponde(fonte, clausula) for clausula in lista('should')) >= minimo
+        return True
+
+    raise ValueError(f'Consulta não suportada pelo servidor local: {list(consulta)}')
+
+
+def normalizar_ordenacao(sort):
+    # devolve [(campo, decrescente, ausentes_primeiro)] a partir das várias formas aceitas pelo Elasticsearch
+    ordenacao = []
+    for item in sort if isinstance(sort, list) else [sort]:
+        if isinstance(item, str):
+            ordenacao.append((item, False, False))
+        else:
+            campo, opcoes = next(iter(item.items()))
+            ordem = opcoes if isinstance(opcoes, str) else opcoes.get('order', 'asc')
+            ausentes = '_last' if isinstance(opcoes, str) else opcoes.get('missing', '_last')
+            ordenacao.append((campo, ordem == 'desc', ausentes == '_first'))
+    return ordenacao
+
+
+def valor_ordenacao(documento, campo):
+    if campo == '_id':
+        return documento.get('_id')
+    valores = valores_campo(documento['_source'], campo)
+    return valores[0] if valores else None
+
+
+class ValorOrdenavel:
+    # ordem total de um valor de ordenação: ausentes (null) recebem uma posição fixa, no fim ou no início com
+    # "missing": "_first", nos dois sentidos, como a sentinela do Elasticsearch; os presentes seguem o sentido pedido.
+    # um search_after com null continua a partir dessa posição, como qualquer outro valor
+    def __init__(self, valor, decrescente=False, ausentes_primeiro=False):
+        self.valor = valor
+        self.decrescente = decrescente
+        self.posicao = 1 if valor is not None else 0 if ausentes_primeiro else 2
+
+    def __eq__(self, outro):
+        return self.posicao == outro.posicao and self.valor == outro.valor
+
+    def __lt__(self, outro):
+        if self.posicao != outro.posicao:
+            return self.posicao < outro.posicao
+        if self.valor is None:
+            return False
+        if self.decrescente:
+            return self.valor > outro.valor
+        return self.valor < outro.valor
+
+
+def chave_ordenacao(valores, ordenacao):
+    return [ValorOrdenavel(valor, decrescente, ausentes_primeiro)
+            for valor, (_, decrescente, ausentes_primeiro) in zip(valores, ordenacao)]
+
+
+def projetar(fonte, filtro):
+    # aplica o parâmetro _source (lista de campos, false, ou includes)
+    if filtro is None or filtro is True:
+        return fonte
+    if filtro is False:
+        return None
+    if isinstance(filtro, dict):
+        filtro = filtro.get('includes', [])
+    if isinstance(filtro, str):
+        filtro = [filtro]
+
+    projetado = {}
+    for campo in filtro:
+        raiz = campo.split('.')[0]
+        if raiz in fonte:
+            projetado[raiz] = fonte[raiz]
+    return projetado
+
+
+# # Agregações
+
+def chave_data(valor, intervalo):
+    data = interpretar_data(valor)
+    if intervalo in ('year', '1y'):
+        inicio = datetime(data.year, 1, 1)
+        formato = '%Y'
+    elif intervalo in ('month', '1M'):
+        inicio = datetime(data.year, data.month, 1)
+        formato = '%Y-%m'
+    else:
+        inicio = datetime(data.year, data.month, data.day)
+        formato = '%Y-%m-%d'
+    inicio = inicio.replace(tzinfo=timezone.utc)
+    return int(inicio.timestamp() * 1000), inicio.strftime(formato)
+
+
+def agregar(documentos, aggs):
+    resultado = {}
+    for nome, definicao in aggs.items():
+        sub_aggs = definicao.get('aggs', definicao.get('aggregations'))
+
+        if 'terms' in definicao:
+            campo = definicao['terms']['field']
+            grupos = {}
+            for documento in documentos:
+                for valor in set(valores_campo(documento['_source'], campo)):
+                    grupos.setdefault(valor, []).append(documento)
+            ordenados = sorted(grupos.items(), key=lambda item: (-len(item[1]), str(item[0])))
+            tamanho = definicao['terms'].get('size', 10)
+            baldes = []
+            for valor, grupo in ordenados[:tamanho]:
+                balde = {'key': valor, 'doc_count': len(grupo)}
+                if sub_aggs:
+                    balde.update(agregar(grupo, sub_aggs))
+                baldes.append(balde)
+            resultado[nome] = {
+                'doc_count_error_upper_bound': 0,
+                'sum_other_doc_count': sum(len(grupo) for _, grupo in ordenados[tamanho:]),
+                'buckets': baldes,
+            }
+
+        elif 'date_histogram' in definicao:
+            opcoes = definicao['date_histogram']
+            intervalo = opcoes.get('calendar_interval', opcoes.get('interval', 'year'))
+            grupos = {}
+            for documento in documentos:
+                for valor in valores_campo(documento['_source'], opcoes['field'])[:1]:
+                    grupos.setdefault(chave_data(valor, intervalo), []).append(documento)
+            baldes = []
+            for (chave, texto), grupo in sorted(grupos.items()):
+                balde = {'key_as_string': texto, 'key': chave, 'doc_count': len(grupo)}
+                if sub_aggs:
+                    balde.update(agregar(grupo, sub_aggs))
+                baldes.append(balde)
+            resultado[nome] = {'buckets': baldes}
+
+        else:
+            tipo = next((tipo for tipo in ('value_count', 'min', 'max', 'avg', 'sum') if tipo in definicao), None)
+            if tipo is None:
+                raise ValueError(f'Agregação não suportada pelo servidor local: {nome}')
+            valores = [valor for documento in documentos for valor in valores_campo(documento['_source'], definicao[tipo]['field'])]
+            if tipo == 'value_count':
+                resultado[nome] = {'value': len(valores)}
+                continue
+            numericos = [valor for valor in valores if isinstance(valor, (int, float))]
+            if tipo == 'sum':
+                valor = sum(numericos)
+            elif not numericos:
+                valor = None
+            elif tipo == 'avg':
+                valor = sum(numericos) / len(numericos)
+            else:
+                valor = min(numericos) if tipo == 'min' else max(numericos)
+            resultado[nome] = {'value': valor}
+
+    return resultado
+
+
+def executar_pesquisa(documentos, tribunal, corpo):
+    inicio = time.perf_counter()
+
+    encontrados = [documento for documento in documentos if corresponde(documento['_source'], corpo.get('query'))]
+
+    ordenacao = normalizar_ordenacao(corpo['sort']) if 'sort' in corpo else []
+    if ordenacao:
+        encontrados.sort(key=lambda documento: chave_ordenacao(
+            [valor_ordenacao(documento, campo) for campo, *_ in ordenacao], ordenacao))
+
+    # o total e as agregações consideram todos os documentos encontrados, independente da página
+    total = len(encontrados)
+    aggs = corpo.get('aggs', corpo.get('aggregations'))
+    agregacoes = agregar(encontrados, aggs) if aggs else None
+
+    restantes = encontrados
+    if 'search_after' in corpo:
+        if not ordenacao:
+            raise ValueError('search_after exige o parâmetro sort')
+        marco = chave_ordenacao(corpo['search_after'], ordenacao)
+        restantes = [documento for documento in encontrados
+                     if marco < chave_ordenacao([valor_ordenacao(documento, campo) for campo, *_ in ordenacao], ordenacao)]
+
+    deslocamento = corpo.get('from', 0)
+    tamanho = corpo.get('size', 10)
+    pagina = restantes[deslocamento:deslocamento + tamanho]
+
+    hits = []
+    for documento in pagina:
+        hit = {'_index': f'api_publica_{tribunal}', '_id': documento.get('_id'), '_score': None if ordenacao else 1.0}
+        fonte = projetar(documento['_source'], corpo.get('_source'))
+        if fonte is not None:
+            hit['_source'] = fonte
+        if ordenacao:
+            hit['sort'] = [valor_ordenacao(documento, campo) for campo, *_ in ordenacao]
+        hits.append(hit)
+
+    resposta = {
+        'took': int((time.perf_counter() - inicio) * 1000),
+        'timed_out': False,
+        'hits': {
+            'total': {'value': total, 'relation': 'eq'},
+            'max_score': None if ordenacao else 1.0,
+            'hits': hits,
+        },
+    }
+
+    if agregacoes is not None:
+        resposta['aggregations'] = agregacoes
+
+    return resposta
+
+
+# # Servidor HTTP
+
+class ManipuladorDataJud(BaseHTTPRequestHandler):
+    # configurados em criar_servidor
+    acervo = {}
+    latencia = 0.0
+    variacao_latencia = 0.0
+    taxa_erro = 0.0
+    exigir_chave = False
+
+    def responder(self, status, corpo, headers=None):
+        conteudo = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(conteudo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def do_POST(self):
+        rota = ROTA_PESQUISA.match(self.path)
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b''
+
+        if not rota:
+            return self.responder(404, {'error': f'rota desconhecida: {self.path}'})
+
+        if self.exigir_chave and not self.headers.get('Authorization', '').startswith('APIKey '):
+            return self.responder(401, {'error': 'Authorization ausente ou inválido'})
+
+        if self.latencia or self.variacao_latencia:
+            time.sleep(max(self.latencia + random.uniform(-self.variacao_latencia, self.variacao_latencia), 0))
+
+        if self.taxa_erro and random.random() < self.taxa_erro:
+            if random.random() < 0.5:
+                return self.responder(429, {'error': 'too_many_requests'}, {'Retry-After': '1'})
+            return self.responder(503, {'error': 'service_unavailable'})
+
+        try:
+            consulta = json.loads(corpo or b'{}')
+            resposta = executar_pesquisa(self.acervo.get(rota.group('tribunal'), []), rota.group('tribunal'), consulta)
+        except (ValueError, KeyError, TypeError) as erro:
+            return self.responder(400, {'error': {'type': 'parsing_exception', 'reason': str(erro)}, 'status': 400})
+
+        self.responder(200, resposta)
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+
+def criar_servidor(acervo, porta=8080, host='127.0.0.1', latencia=0.0, variacao_latencia=0.0, taxa_erro=0.0,
+                   exigir_chave=False, silencioso=False):
+    # latências em segundos; taxa_erro entre 0 e 1
+    manipulador = type('Manipulador', (ManipuladorDataJud,), {
+        'acervo': acervo,
+        'latencia': latencia,
+        'variacao_latencia': variacao_latencia,
+        'taxa_erro': taxa_erro,
+        'exigir_chave': exigir_chave,
+    })
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.silencioso = silencioso
+    return servidor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor local que simula a API Pública do DataJud a partir de fixtures.')
+    parser.add_argument('--fixtures', required=True, help='pasta com as fixtures .json.gz e/ou acervos .jsonl')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--latencia', type=float, default=0, help='latência por requisição, em milissegundos')
+    parser.add_argument('--variacao-latencia', type=float, default=0, help='variação aleatória da latência, em milissegundos')
+    parser.add_argument('--taxa-erro', type=float, default=0, help='fração das requisições que recebem 429/503')
+    parser.add_argument('--semente', type=int, help='semente do gerador aleatório, para execuções reprodutíveis')
+    parser.add_argument('--exigir-chave', action='store_true', help='recusa requisições sem o header Authorization')
+    parser.add_argument('--silencioso', action='store_true')
+    args = parser.parse_args()
+
+    if args.semente is not None:
+        random.seed(args.semente)
+
+    acervo = carregar_acervo(args.fixtures)
+    for tribunal, documentos in sorted(acervo.items()):
+        print(f'{tribunal}: {len(documentos)} documentos')
+
+    servidor = criar_servidor(acervo, args.porta, args.host, args.latencia / 1000, args.variacao_latencia / 1000,
+                              args.taxa_erro, args.exigir_chave, args.silencioso)
+    print(f'Servindo em http://{args.host}:{args.porta} (use DATAJUD_URL_BASE=http://{args.host}:{args.porta})')
+    servidor.serve_forever()
@@ -0,0 +1,105 @@
+# Acervo sintético no formato da API e reprodução em pandas dos groupbys do notebook,
+# usados como referência pelos testes
+
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+
+ORGAOS = [101, 202]
+
+SITUACOES = ['Arquivamento Definitivo', 'Baixa Definitiva', 'Procedência', 'Improcedência', 'Conclusão',
+             'Juntada de Petição', 'Desistência']
+
+ASSUNTOS = ['Dano Moral', 'Indenização por Dano Material', 'Obrigação de Fazer / Não Fazer', 'Alimentos']
+
+CLASSES = ['Procedimento Comum Cível', 'Procedimento do Juizado Especial Cível', 'Execução Fiscal']
+
+terminado = ['definitivo', 'baixa definitiva', 'baixa', 'improcedência', 'procedência', 'procedência em parte', 'incompetência',
+             'extinção da execução ou do cumprimento da sentença', 'prescrição intercorrente', 'ausência de pressupostos processuais',
+             'ausência das condições da ação', 'desistência', 'abandono da causa']
+
+
+def gerar_acervo(quantidade=120, semente=7):
+    aleatorio = random.Random(semente)
+    documentos = []
+    for i in range(quantidade):
+        ajuizamento = datetime(2015, 1, 1) + timedelta(days=aleatorio.randint(0, 3000), hours=aleatorio.randint(0, 23))
+        movimentos = []
+        data = ajuizamento
+        for _ in range(aleatorio.randint(0, 4)):
+            data += timedelta(days=aleatorio.randint(1, 400), minutes=aleatorio.randint(0, 600))
+            movimentos.append({'codigo': aleatorio.randint(1, 999), 'nome': aleatorio.choice(SITUACOES),
+                               'dataHora': data.strftime('%Y-%m-%dT%H:%M:%S.000Z')})
+        documento = {
+            # indexação em lote: grupos de 10 documentos com o mesmo @timestamp
+            '@timestamp': f'2024-01-01T00:00:{i // 10:02d}.000Z',
+            'numeroProcesso': f'{i:020d}',
+            'grau': 'G1',
+            'classe': {'codigo': 1, 'nome': aleatorio.choice(CLASSES)},
+            'assuntos': [{'codigo': 2, 'nome': nome} for nome in aleatorio.sample(ASSUNTOS, aleatorio.randint(1, 2))],
+            'formato': {'codigo': 1, 'nome': aleatorio.choice(['Eletrônico', 'Físico'])},
+            'orgaoJulgador': {'codigo': aleatorio.choice(ORGAOS), 'nome': 'Vara Cível', 'codigoMunicipioIBGE': 2611606},
+            'dataAjuizamento': ajuizamento.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'dataHoraUltimaAtualizacao': data.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'movimentos': movimentos,
+        }
+        # alguns processos sem classe, para exercitar o descarte (dropna)
+        if i % 17 == 0:
+            del documento['classe']
+        documentos.append(documento)
+    return documentos
+
+
+def estatisticas_pandas(hits, agora):
+    # reprodução das células do notebook (Segunda Etapa e Etapa de Análise)
+    processos = []
+    for processo in hits:
+        fonte = processo['_source']
+        classe = fonte['classe']['nome'] if 'classe' in fonte else None
+        movimentos = fonte.get('movimentos', [])
+        ult_mov = movimentos[-1] if movimentos else None
+        processos.append([
+            fonte['numeroProcesso'], classe, ', '.join([assunto['nome'] for assunto in fonte['assuntos']]),
+            fonte['dataAjuizamento'], fonte['dataHoraUltimaAtualizacao'], fonte['formato']['nome'],
+            fonte['orgaoJulgador']['codigo'], fonte['orgaoJulgador']['nome'], fonte['orgaoJulgador']['codigoMunicipioIBGE'],
+            fonte.get('grau'), movimentos, ult_mov['nome'] if ult_mov else None, ult_mov['dataHora'] if ult_mov else None,
+        ])
+    df = pd.DataFrame(processos, columns=[
+        'numero_processo', 'classe', 'assunto', 'data_ajuizamento', 'ultima_atualizacao',
+        'formato', 'codigo', 'orgao_julgador', 'municipio', 'grau', 'movimentos', 'situacao', 'ultimo_mov'
+    ])
+    df.dropna(inplace=True)
+
+    for coluna in ['classe', 'assunto', 'formato', 'orgao_julgador', 'situacao']:
+        df[coluna] = df[coluna].str.lower()
+    df['data_ajuizamento'] = pd.to_datetime(df['data_ajuizamento'])
+    df['ultimo_mov'] = pd.to_datetime(df['ultimo_mov'])
+
+    agora = pd.Timestamp(agora, tz='UTC')
+
+    def calcular_contagem_dias(row):
+        if 'definitivo' in row['situacao'] or 'baixa definitiva' in row['situacao']:
+            return (row['ultimo_mov'] - row['data_ajuizamento']).days
+        return (agora - row['data_ajuizamento']).days
+
+    df['contagem_dias'] = df.apply(calcular_contagem_dias, axis=1)
+    df['julgado'] = df['situacao'].apply(lambda x: any(term in x for term in terminado))
+    df_julgados = df[df['julgado']].copy()
+
+    df['ano_ajuizamento'] = df['data_ajuizamento'].dt.year
+    ajuizados_por_ano = df['ano_ajuizamento'].value_counts().sort_index().rename_axis('ano').reset_index(name='quantidade_ajuizados')
+    df_julgados['ano_ajuizamento'] = df_julgados['data_ajuizamento'].dt.year
+    julgados_por_ano = df_julgados['ano_ajuizamento'].value_counts().sort_index().rename_axis('ano').reset_index(name='quantidade_julgados')
+
+    return {
+        'df': df,
+        'quantidade_julgados': len(df_julgados),
+        'porcentagem_processos_fisicos': (len(df[df['formato'] == 'físico']) / len(df)) * 100,
+        'media_tempo_geral': df['contagem_dias'].mean().astype(int),
+        'media_tempo_por_assunto': df_julgados.groupby('assunto')['contagem_dias'].mean().astype(int),
+        'media_tempo_por_classe': df_julgados.groupby('classe')['contagem_dias'].mean().astype(int),
+        'media_tempo_por_assunto_todos': df.groupby('assunto')['contagem_dias'].mean().astype(int),
+        'comparativo_ano': pd.merge(ajuizados_por_ano, julgados_por_ano, on='ano', how='left').fillna(0),
+    }
@@ -0,0 +1,40 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+# os scripts ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datajud  # noqa: E402
+import servidor_mock  # noqa: E402
+
+
+@pytest.fixture
+def servir(tmp_path, monkeypatch):
+    # sobe o servidor local com os documentos dados ({tribunal: [_source, ...]}) e aponta a API para ele;
+    # o acervo servido fica em servidor.RequestHandlerClass.acervo e pode ser alterado durante o teste
+    servidores = []
+
+    def servir(documentos_por_tribunal, **opcoes):
+        pasta = tmp_path / f'acervo_{len(servidores)}'
+        pasta.mkdir()
+        for tribunal, documentos in documentos_por_tribunal.items():
+            with open(pasta / f'{tribunal}.jsonl', 'w', encoding='utf-8') as arquivo:
+                for documento in documentos:
+                    arquivo.write(json.dumps(documento, ensure_ascii=False) + '\n')
+
+        servidor = servidor_mock.criar_servidor(servidor_mock.carregar_acervo(str(pasta)), porta=0, silencioso=True, **opcoes)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        servidores.append(servidor)
+        monkeypatch.setattr(datajud, 'URL_BASE', f'http://127.0.0.1:{servidor.server_port}')
+        monkeypatch.setattr(datajud, 'PASTA_REPRODUCAO', None)
+        monkeypatch.setattr(datajud, 'PASTA_GRAVACAO', None)
+        return servidor
+
+    yield servir
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
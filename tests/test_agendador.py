@@ -0,0 +1,119 @@
+# Coleta com várias chaves: desativação de chaves inválidas, repetições e limite de throttling
+
+import itertools
+
+import requests
+
+import agendador
+from acervo_sintetico import ORGAOS, gerar_acervo
+from agendador import Agendador, Tarefa, tarefas_orgaos
+
+
+def erro_http(status, retry_after=None):
+    resposta = requests.Response()
+    resposta.status_code = status
+    if retry_after is not None:
+        resposta.headers['Retry-After'] = retry_after
+    return requests.HTTPError(f'HTTP {status}', response=resposta)
+
+
+def coletar(agendador_, orgaos, tamanho=7):
+    recebidos = {}
+
+    def ao_receber(tribunal, codigo, hits):
+        recebidos.setdefault((tribunal, codigo), []).extend(hit['_source']['numeroProcesso'] for hit in hits)
+
+    for tarefa in tarefas_orgaos(orgaos, ao_receber, tamanho=tamanho):
+        agendador_.adicionar(tarefa)
+    return agendador_.executar(), recebidos
+
+
+def test_chave_invalida_e_desativada_e_a_coleta_termina_com_as_outras(servir):
+    documentos = gerar_acervo()
+    servir({'tjpe': documentos}, exigir_chave=True)
+    # o servidor local recusa com 401 chaves sem o prefixo "APIKey "
+    agendador_ = Agendador(['chave-revogada', 'APIKey boa'], workers=4, espera_throttle=0.01)
+
+    falhas, recebidos = coletar(agendador_, [('tjpe', codigo) for codigo in ORGAOS])
+
+    assert falhas == []
+    for codigo in ORGAOS:
+        esperados = sorted(doc['numeroProcesso'] for doc in documentos if doc['orgaoJulgador']['codigo'] == codigo)
+        assert sorted(recebidos[('tjpe', codigo)]) == esperados
+    revogada, boa = agendador_.chaves
+    assert revogada.desativada and revogada.sucessos == 0
+    assert not boa.desativada and boa.sucessos > 0
+    assert 'desativada' in agendador_.relatorio()
+
+
+def test_sem_chaves_validas_as_tarefas_viram_falhas(servir):
+    servir({'tjpe': gerar_acervo()}, exigir_chave=True)
+    agendador_ = Agendador(['revogada-1', 'revogada-2'], workers=2)
+
+    falhas, recebidos = coletar(agendador_, [('tjpe', codigo) for codigo in ORGAOS])
+
+    assert recebidos == {}
+    assert sorted(tarefa.contexto for tarefa, _ in falhas) == ORGAOS
+    assert all(chave.desativada for chave in agendador_.chaves)
+
+
+def test_erros_do_endpoint_consomem_tentativas(monkeypatch):
+    def pesquisar(*args, **kwargs):
+        raise erro_http(503)
+
+    monkeypatch.setattr(agendador, 'pesquisar', pesquisar)
+    agendador_ = Agendador(['APIKey a'], tentativas=3, espera_throttle=0.001)
+    agendador_.adicionar(Tarefa('tjpe', {}))
+
+    falhas = agendador_.executar()
+
+    assert len(falhas) == 1
+    tarefa, erro = falhas[0]
+    assert tarefa.tentativas == 3 and erro.response.status_code == 503
+
+
+def test_throttling_nao_consome_tentativas_mas_tem_limite(monkeypatch):
+    # três 429 seguidos e depois sucesso: com uma única tentativa, a consulta ainda conclui
+    respostas = itertools.chain([erro_http(429, '0')] * 3, itertools.repeat({'hits': {'hits': []}}))
+
+    def pesquisar(*args, **kwargs):
+        resposta = next(respostas)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    monkeypatch.setattr(agendador, 'pesquisar', pesquisar)
+    concluidas = []
+    agendador_ = Agendador(['APIKey a', 'APIKey b'], tentativas=1)
+    agendador_.adicionar(Tarefa('tjpe', {}, lambda tarefa, resposta: concluidas.append(tarefa)))
+    assert agendador_.executar() == []
+    assert concluidas[0].throttles == 3 and concluidas[0].tentativas == 0
+
+    # cota esgotada em todas as chaves: a consulta desiste no limite e executar() termina
+    def sempre_429(*args, **kwargs):
+        raise erro_http(429, '0')
+
+    monkeypatch.setattr(agendador, 'pesquisar', sempre_429)
+    agendador_ = Agendador(['APIKey a', 'APIKey b'], limite_throttles=4)
+    agendador_.adicionar(Tarefa('tjpe', {}, contexto=1234))
+    falhas = agendador_.executar()
+    assert [(tarefa.contexto, tarefa.throttles, tarefa.tentativas) for tarefa, _ in falhas] == [(1234, 4, 0)]
+
+
+def test_erro_no_callback_vira_falha_sem_derrubar_o_worker(monkeypatch):
+    monkeypatch.setattr(agendador, 'pesquisar', lambda *args, **kwargs: {'hits': {'hits': []}})
+    concluidas = []
+
+    def ao_concluir(tarefa, resposta):
+        if tarefa.contexto == 'ruim':
+            raise RuntimeError('disco cheio')
+        concluidas.append(tarefa.contexto)
+
+    agendador_ = Agendador(['APIKey a'], workers=1)
+    for contexto in ('ruim', 'boa-1', 'boa-2'):
+        agendador_.adicionar(Tarefa('tjpe', {}, ao_concluir, contexto))
+
+    falhas = agendador_.executar()
+
+    assert [tarefa.contexto for tarefa, _ in falhas] == ['ruim']
+    assert sorted(concluidas) == ['boa-1', 'boa-2']
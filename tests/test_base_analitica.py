@@ -0,0 +1,59 @@
+# Paginação dos órgãos e estatísticas SQL da base analítica
+
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from acervo_sintetico import ORGAOS, estatisticas_pandas, gerar_acervo
+from base_analitica import (carregar_hits, comparativo_ano, conectar, media_tempo_por_assunto, media_tempo_por_classe,
+                            paginas_orgao, proporcao_julgados)
+
+
+def test_paginas_orgao_nao_perde_documentos_com_timestamp_repetido(servir):
+    # 20 dos 25 processos indexados no mesmo lote, e um deles também no 2º grau
+    documentos = [{'@timestamp': '2024-01-01T00:00:00.000Z' if i < 20 else f'2024-01-02T00:00:{i:02d}.000Z',
+                   'numeroProcesso': f'{i:020d}', 'grau': 'G1', 'orgaoJulgador': {'codigo': 1}} for i in range(25)]
+    documentos.append(dict(documentos[0], grau='G2'))
+    servir({'tjpe': documentos})
+
+    vistos = [(hit['_source']['numeroProcesso'], hit['_source']['grau'])
+              for hits in paginas_orgao('tjpe', 1, tamanho=7) for hit in hits]
+    assert len(vistos) == len(set(vistos)) == 26
+
+    con = conectar(':memory:')
+    for hits in paginas_orgao('tjpe', 1, tamanho=7):
+        carregar_hits(con, 'tjpe', hits)
+    assert con.execute('select count(*) from processos').fetchone()[0] == 26
+
+
+def test_estatisticas_sql_reproduzem_groupbys_do_notebook(servir):
+    servir({'tjpe': gerar_acervo()})
+    con = conectar(':memory:')
+    hits_por_orgao = {}
+    for codigo in ORGAOS:
+        for hits in paginas_orgao('tjpe', codigo, tamanho=7):
+            carregar_hits(con, 'tjpe', hits)
+            hits_por_orgao.setdefault(codigo, []).extend(hits)
+
+    # o SQL conta os dias até julianday('now'), em UTC
+    agora = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ', timespec='seconds')
+    esperado = estatisticas_pandas(hits_por_orgao[ORGAOS[0]] + hits_por_orgao[ORGAOS[1]], agora)
+
+    proporcao = proporcao_julgados(con, 'tjpe').iloc[0]
+    assert proporcao['total_processos'] == len(esperado['df'])
+    assert proporcao['quantidade_julgados'] == esperado['quantidade_julgados']
+    julgados = pd.read_sql_query('select * from v_julgados', con)
+    assert julgados['total_processos'].sum() == len(esperado['df'])
+
+    for funcao, coluna in ((media_tempo_por_assunto, 'assunto'), (media_tempo_por_classe, 'classe')):
+        pd.testing.assert_series_equal(funcao(con, 'tjpe').set_index(coluna)['media_dias'].sort_index(),
+                                       esperado[f'media_tempo_por_{coluna}'], check_names=False)
+    pd.testing.assert_frame_equal(comparativo_ano(con, 'tjpe'), esperado['comparativo_ano'], check_dtype=False)
+
+    # filtros por órgão e ano
+    do_orgao = estatisticas_pandas(hits_por_orgao[ORGAOS[1]], agora)
+    por_assunto = media_tempo_por_assunto(con, 'tjpe', orgao_codigo=ORGAOS[1]).set_index('assunto')['media_dias']
+    pd.testing.assert_series_equal(por_assunto.sort_index(), do_orgao['media_tempo_por_assunto'], check_names=False)
+    ano = int(esperado['comparativo_ano']['ano'].iloc[0])
+    quantidade = media_tempo_por_classe(con, 'tjpe', ano=ano)['quantidade'].sum()
+    assert quantidade == esperado['comparativo_ano']['quantidade_julgados'].iloc[0]
@@ -0,0 +1,59 @@
+# Compara as estatísticas em streaming com os groupbys do notebook (pandas),
+# usando um acervo sintético servido pelo servidor local
+
+import json
+
+import pandas as pd
+import pytest
+
+import datajud
+from acervo_sintetico import ORGAOS, estatisticas_pandas, gerar_acervo
+from base_analitica import paginas_orgao
+from estatisticas_streaming import CAMPOS, EstatisticasStreaming
+
+
+AGORA = '2024-06-01 00:00:00'
+
+
+@pytest.fixture
+def servidor(servir):
+    return servir({'tjpe': gerar_acervo()})
+
+
+def processar_shard(codigo):
+    # páginas pequenas para exercitar o search_after do servidor local
+    estatisticas = EstatisticasStreaming(AGORA)
+    for hits in paginas_orgao('tjpe', codigo, tamanho=7, campos=CAMPOS):
+        estatisticas.adicionar_hits('tjpe', hits)
+    return estatisticas
+
+
+def test_streaming_reproduz_groupbys_do_notebook(servidor):
+    hits = []
+    for codigo in ORGAOS:
+        hits += datajud.pesquisar('tjpe', {"size": 10000, "query": {"match": {"orgaoJulgador.codigo": codigo}}})['hits']['hits']
+    esperado = estatisticas_pandas(hits, AGORA)
+
+    # um shard por órgão, combinados depois de passar pelo JSON dos parciais
+    parciais = [EstatisticasStreaming.de_dict(json.loads(json.dumps(processar_shard(codigo).para_dict()))) for codigo in ORGAOS]
+    estatisticas = parciais[0].combinar(parciais[1])
+
+    assert estatisticas.total == len(esperado['df'])
+    assert estatisticas.total + estatisticas.descartados == len(hits)
+    proporcao = estatisticas.proporcao_julgados()
+    assert proporcao['quantidade_julgados'] == esperado['quantidade_julgados']
+    assert proporcao['porcentagem_processos_fisicos'] == pytest.approx(esperado['porcentagem_processos_fisicos'])
+    assert estatisticas.media_tempo_geral() == esperado['media_tempo_geral']
+
+    pd.testing.assert_series_equal(estatisticas.media_tempo_por_assunto(), esperado['media_tempo_por_assunto'],
+                                   check_names=False)
+    pd.testing.assert_series_equal(estatisticas.media_tempo_por_classe(), esperado['media_tempo_por_classe'],
+                                   check_names=False)
+    pd.testing.assert_series_equal(estatisticas.media_tempo_por_assunto(apenas_julgados=False),
+                                   esperado['media_tempo_por_assunto_todos'], check_names=False)
+    pd.testing.assert_frame_equal(estatisticas.comparativo_ano(), esperado['comparativo_ano'], check_dtype=False)
+
+
+def test_combinar_recusa_datas_de_referencia_diferentes():
+    with pytest.raises(ValueError):
+        EstatisticasStreaming('2024-06-01 00:00:00').combinar(EstatisticasStreaming('2024-06-02 00:00:00'))
@@ -0,0 +1,121 @@
+# Detecção de novos movimentos e recuo após erros do monitoramento de carteira
+
+import json
+
+import pytest
+import requests
+
+import monitoramento
+from monitoramento import chave_movimento, executar_ciclo, novos_movimentos, resumir_movimentos
+
+
+def movimento(data, codigo, nome='Juntada de Petição'):
+    return {'codigo': codigo, 'nome': nome, 'dataHora': data}
+
+
+def documento(numero, movimentos):
+    return {'numeroProcesso': numero, 'grau': 'G1', 'dataHoraUltimaAtualizacao': max(m['dataHora'] for m in movimentos),
+            'movimentos': movimentos}
+
+
+def test_novos_movimentos_compara_com_a_data_e_as_impressoes_do_ultimo():
+    conhecidos = [movimento('2024-01-10T10:00:00', 1), movimento('2024-01-10T10:00:00', 2), movimento('2024-01-05T09:00:00', 3)]
+    registro = resumir_movimentos({chave_movimento(m) for m in conhecidos})
+    assert registro['ultimo_movimento'] == '2024-01-10T10:00:00'
+    assert len(registro['impressoes']) == 2 and registro['quantidade'] == 3
+
+    mesma_data = movimento('2024-01-10T10:00:00', 4)
+    posterior = movimento('2024-02-01T08:00:00', 5)
+    anterior = movimento('2024-01-01T08:00:00', 6)
+    novos = novos_movimentos(registro, conhecidos + [mesma_data, posterior, anterior, posterior])
+    # o movimento anterior ao último conhecido não é identificável pelo estado compacto; o repetido conta uma vez
+    assert novos == [mesma_data, posterior]
+
+
+def test_ciclo_emite_novos_e_retroativos(servir):
+    servidor = servir({'tjpe': [
+        documento('1', [movimento('2024-01-10T10:00:00', 1)]),
+        documento('2', [movimento('2024-01-10T10:00:00', 1), movimento('2024-01-12T10:00:00', 2)]),
+        documento('3', [movimento('2024-01-03T10:00:00', 1)]),
+    ]})
+    estado = {'processos': {}}
+
+    # primeira consulta só guarda o histórico
+    assert executar_ciclo('tjpe', ['1', '2', '3'], estado, agora=0) == []
+    assert json.loads(json.dumps(estado)) == estado
+
+    fontes = {doc['_source']['numeroProcesso']: doc['_source'] for doc in servidor.RequestHandlerClass.acervo['tjpe']}
+    fontes['1']['movimentos'].append(movimento('2024-02-01T10:00:00', 7, 'Conclusão'))
+    fontes['1']['dataHoraUltimaAtualizacao'] = '2024-02-01T10:00:00'
+    fontes['2']['movimentos'] += [movimento('2024-01-11T10:00:00', 8), movimento('2024-01-11T11:00:00', 9)]
+    fontes['2']['dataHoraUltimaAtualizacao'] = '2024-02-02T10:00:00'
+
+    eventos = executar_ciclo('tjpe', ['1', '2', '3'], estado, agora=10 ** 6)
+    assert [(e['evento'], e['numero_processo']) for e in eventos] == [('novo_movimento', '1'), ('movimentos_retroativos', '2')]
+    assert eventos[0]['codigo'] == 7 and eventos[0]['descricao_movimento'] == 'Conclusão'
+    assert eventos[1]['quantidade'] == 2
+
+    # sem alterações, nada novo; os movimentados voltam ao intervalo mínimo e o parado dobra
+    assert executar_ciclo('tjpe', ['1', '2', '3'], estado, agora=10 ** 7) == []
+    assert estado['processos']['1']['intervalo'] == monitoramento.INTERVALO_MINIMO * 2
+    assert estado['processos']['3']['intervalo'] == monitoramento.INTERVALO_MINIMO * 4
+
+
+def test_eventos_entregues_antes_da_falha_de_um_sublote_seguinte(servir, monkeypatch):
+    servidor = servir({'tjpe': [documento(str(i), [movimento('2024-01-10T10:00:00', 1)]) for i in range(2)]})
+    estado = {'processos': {}}
+    executar_ciclo('tjpe', ['0', '1'], estado, agora=0)
+    for doc in servidor.RequestHandlerClass.acervo['tjpe']:
+        doc['_source']['movimentos'].append(movimento('2024-03-01T10:00:00', 2))
+        doc['_source']['dataHoraUltimaAtualizacao'] = '2024-03-01T10:00:00'
+
+    # um processo por sublote; a busca do segundo falha
+    monkeypatch.setattr(monitoramento, 'TAMANHO_LOTE_MOVIMENTOS', 1)
+    buscar = monitoramento.buscar_movimentos
+
+    def buscar_ou_falhar(tribunal, numeros, sessao=None):
+        if numeros == ['1']:
+            raise requests.ConnectionError('conexão perdida')
+        return buscar(tribunal, numeros, sessao)
+
+    monkeypatch.setattr(monitoramento, 'buscar_movimentos', buscar_ou_falhar)
+    emitidos = []
+    with pytest.raises(requests.ConnectionError):
+        executar_ciclo('tjpe', ['0', '1'], estado, agora=10 ** 6, ao_emitir=emitidos.extend)
+    assert [e['numero_processo'] for e in emitidos] == ['0']
+
+    # o processo que falhou é detectado no ciclo seguinte; o já emitido não se repete
+    monkeypatch.setattr(monitoramento, 'buscar_movimentos', buscar)
+    eventos = executar_ciclo('tjpe', ['0', '1'], estado, agora=10 ** 6)
+    assert [e['numero_processo'] for e in eventos] == ['1']
+
+
+def test_monitorar_recua_apos_erros_e_respeita_retry_after(tmp_path, monkeypatch):
+    carteira = tmp_path / 'carteira.txt'
+    carteira.write_text('1\n')
+    caminho_estado = tmp_path / 'estado.json'
+    # processo com consulta vencida há muito tempo: sem o recuo, a espera calculada seria negativa
+    caminho_estado.write_text(json.dumps({'processos': {'1': {'proxima_consulta': 0}}}))
+
+    retry_after = iter([None, None, '500', None])
+
+    def falhar(*args, **kwargs):
+        resposta = requests.Response()
+        resposta.status_code = 429
+        valor = next(retry_after)
+        if valor:
+            resposta.headers['Retry-After'] = valor
+        raise requests.HTTPError('429 Too Many Requests', response=resposta)
+
+    esperas = []
+
+    def dormir(segundos):
+        esperas.append(segundos)
+        if len(esperas) == 4:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(monitoramento, 'executar_ciclo', falhar)
+    monkeypatch.setattr(monitoramento.time, 'sleep', dormir)
+    with pytest.raises(KeyboardInterrupt):
+        monitoramento.monitorar('tjpe', str(carteira), str(caminho_estado), caminho_eventos=None)
+    assert esperas == [30, 60, 500, 240]
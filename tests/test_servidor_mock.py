@@ -0,0 +1,111 @@
+# Semântica das consultas, da ordenação e das agregações do servidor local
+
+import pytest
+import requests
+
+import datajud
+from servidor_mock import carregar_acervo
+
+
+DOCUMENTOS = [
+    {'numeroProcesso': '1', 'grau': 'G1', 'classe': {'codigo': 7, 'nome': 'Procedimento Comum Cível'},
+     'assuntos': [{'codigo': 10, 'nome': 'Dano Moral'}], 'dataAjuizamento': '20200312000000', 'prioridade': 3},
+    {'numeroProcesso': '2', 'grau': 'G2', 'classe': {'codigo': 7, 'nome': 'Procedimento Comum Cível'},
+     'assuntos': [{'codigo': 11, 'nome': 'Alimentos'}, {'codigo': 10, 'nome': 'Dano Moral'}],
+     'dataAjuizamento': '2020-07-01T10:00:00.000Z', 'prioridade': 1},
+    {'numeroProcesso': '3', 'grau': 'G1', 'classe': {'codigo': 1116, 'nome': 'Execução Fiscal'},
+     'assuntos': [{'codigo': 12, 'nome': 'Dívida Ativa'}], 'dataAjuizamento': '20201115103000'},
+    {'numeroProcesso': '4', 'grau': 'G1', 'classe': {'codigo': 1116, 'nome': 'Execução Fiscal'},
+     'assuntos': [{'codigo': 12, 'nome': 'Dívida Ativa'}], 'dataAjuizamento': '2021-01-02T00:00:00.000Z', 'prioridade': 2},
+    {'numeroProcesso': '5', 'grau': 'G1', 'classe': {'codigo': 7, 'nome': 'Procedimento Comum Cível'},
+     'assuntos': [{'codigo': 11, 'nome': 'Alimentos'}], 'dataAjuizamento': '20190101000000'},
+]
+
+
+@pytest.fixture
+def servidor(servir):
+    return servir({'tjpe': DOCUMENTOS})
+
+
+def numeros(consulta):
+    return sorted(hit['_source']['numeroProcesso'] for hit in datajud.pesquisar('tjpe', consulta)['hits']['hits'])
+
+
+def test_consultas(servidor):
+    assert numeros({'query': {'term': {'classe.codigo': '1116'}}}) == ['3', '4']
+    assert numeros({'query': {'terms': {'numeroProcesso.keyword': ['1', '5', '9']}}}) == ['1', '5']
+    # match em campo de lista percorre todos os itens
+    assert numeros({'query': {'match': {'assuntos.nome': 'alimentos'}}}) == ['2', '5']
+    assert numeros({'query': {'bool': {
+        'must': [{'match': {'classe.nome': 'Procedimento Comum Cível'}}],
+        'must_not': [{'term': {'grau': 'G2'}}],
+    }}}) == ['1', '5']
+    assert numeros({'query': {'bool': {'should': [{'term': {'grau': 'G2'}}, {'term': {'numeroProcesso': '4'}}]}}}) == ['2', '4']
+
+
+def test_range_compara_datas_compactas_e_iso(servidor):
+    consulta = {'query': {'range': {'dataAjuizamento': {'gte': '2020-06-01', 'lt': '2021-01-01T00:00:00.000Z'}}}}
+    assert numeros(consulta) == ['2', '3']
+    assert numeros({'query': {'range': {'dataAjuizamento': {'lte': '20200312000000'}}}}) == ['1', '5']
+    assert numeros({'query': {'range': {'prioridade': {'gt': 1, 'lte': 3}}}}) == ['1', '4']
+
+
+def test_date_histogram_com_datas_compactas(servidor):
+    resposta = datajud.pesquisar('tjpe', {'size': 0, 'aggs': {'anos': {
+        'date_histogram': {'field': 'dataAjuizamento', 'calendar_interval': 'year'},
+        'aggs': {'classes': {'terms': {'field': 'classe.codigo'}}},
+    }}})
+    assert resposta['hits']['hits'] == [] and resposta['hits']['total']['value'] == 5
+    baldes = resposta['aggregations']['anos']['buckets']
+    assert [(balde['key_as_string'], balde['doc_count']) for balde in baldes] == [('2019', 1), ('2020', 3), ('2021', 1)]
+    assert [(b['key'], b['doc_count']) for b in baldes[1]['classes']['buckets']] == [(7, 2), (1116, 1)]
+
+
+def paginar(ordenacao, tamanho=2):
+    consulta = {'size': tamanho, 'sort': ordenacao}
+    vistos = []
+    while True:
+        hits = datajud.pesquisar('tjpe', consulta)['hits']['hits']
+        if not hits:
+            return vistos
+        vistos += [hit['_source']['numeroProcesso'] for hit in hits]
+        consulta['search_after'] = hits[-1]['sort']
+
+
+def test_search_after_com_valores_ausentes(servidor):
+    # prioridade ausente em 3 e 5: ficam no fim nos dois sentidos, e a paginação continua depois do null
+    desempate = {'numeroProcesso.keyword': 'asc'}
+    assert paginar([{'prioridade': 'asc'}, desempate]) == ['2', '4', '1', '3', '5']
+    assert paginar([{'prioridade': {'order': 'desc'}}, desempate]) == ['1', '4', '2', '3', '5']
+    assert paginar([{'prioridade': {'order': 'asc', 'missing': '_first'}}, desempate], tamanho=1) == ['3', '5', '2', '4', '1']
+
+
+def test_search_after_pula_empates_sem_desempate(servidor):
+    # como no Elasticsearch: documentos com os mesmos valores de ordenação que o último da página são pulados
+    assert paginar([{'grau': 'asc'}], tamanho=1) == ['1', '2']
+    assert paginar([{'grau': 'asc'}, {'numeroProcesso.keyword': 'asc'}], tamanho=1) == ['1', '3', '4', '5', '2']
+
+
+def test_agregacao_nao_suportada_responde_400(servidor):
+    with pytest.raises(requests.HTTPError) as erro:
+        datajud.pesquisar('tjpe', {'aggs': {'percentis': {'percentiles': {'field': 'prioridade'}}}})
+    assert erro.value.response.status_code == 400
+
+
+def test_exigir_chave(servir):
+    servir({'tjpe': DOCUMENTOS}, exigir_chave=True)
+    with pytest.raises(requests.HTTPError) as erro:
+        datajud.pesquisar('tjpe', {}, api_key='chave-sem-prefixo')
+    assert erro.value.response.status_code == 401
+    assert len(datajud.pesquisar('tjpe', {})['hits']['hits']) == 5
+
+
+def test_acervo_junta_fixtures_projetadas_do_mesmo_documento(tmp_path):
+    completo = {'_id': 'a', '_source': {'numeroProcesso': '1', 'movimentos': [{'codigo': 1}], 'dataHoraUltimaAtualizacao': 'x'}}
+    projetado = {'_id': 'a', '_source': {'numeroProcesso': '1', 'dataHoraUltimaAtualizacao': 'y'}}
+    # qualquer que seja a ordem dos arquivos, a fixture projetada não esconde os movimentos
+    for consulta, hit in (({'q': 1}, completo), ({'q': 2}, projetado)):
+        datajud.gravar_fixture(str(tmp_path), 'tjpe', consulta, {'hits': {'hits': [hit]}})
+    acervo = carregar_acervo(str(tmp_path))
+    assert len(acervo['tjpe']) == 1
+    assert set(acervo['tjpe'][0]['_source']) == {'numeroProcesso', 'movimentos', 'dataHoraUltimaAtualizacao'}